@@ -0,0 +1,297 @@
+"""Pipelined Azure synthesis against a local stand-in for the Speech SDK.
+
+The stand-in replaces only speechsdk.SpeechConfig and SpeechSynthesizer: it
+works through requests one at a time on its own thread, like the SDK, and
+emits synthesis_started, word boundary, synthesizing and completed/canceled
+events with made-up audio. A conversation with a stub agent answers one
+caller turn with a few sentences through call_server's AzureSynthesizer.
+
+For each lookahead, reports how long the caller heard silence between
+sentences, and how many requests Azure finished or stopped once the bot was
+interrupted on its first sentence; the rest were never sent. With
+--drop-queued-on-stop, stopping one request also cancels the queued ones.
+
+  python -m benchmarks.azure_synthesis --sentences 4 --first-byte-ms 300
+"""
+import argparse
+import asyncio
+import os
+import queue
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Generator, Optional
+from xml.etree import ElementTree
+
+import azure.cognitiveservices.speech as speechsdk
+
+os.environ.setdefault("AZURE_SPEECH_KEY", "stub")
+os.environ.setdefault("AZURE_SPEECH_REGION", "stub")
+
+from vocode.streaming.agent.base_agent import BaseAgent
+from vocode.streaming.models.agent import AgentConfig
+from vocode.streaming.models.audio_encoding import AudioEncoding
+from vocode.streaming.models.message import BaseMessage
+from vocode.streaming.models.synthesizer import AzureSynthesizerConfig
+from vocode.streaming.telephony.constants import DEFAULT_SAMPLING_RATE
+from vocode.streaming.transcriber.base_transcriber import Transcription
+
+from benchmarks.call_load import StubTranscriber, create_call_config
+from call_server.media_codec import MULAW_SILENCE
+from call_server.metrics import FIRST_AUDIO_SENT
+from call_server.streaming_conversation import StreamingConversation
+from call_server.synthesizer import AzureSynthesizer
+
+SENTENCE = "This is one of the sentences the bot says in reply."
+# a second of audio per sentence keeps every sentence to one or two chunks
+WORD_SECONDS = 0.1
+
+
+class StubSignal:
+
+  def __init__(self):
+    self.callbacks = []
+
+  def connect(self, callback):
+    self.callbacks.append(callback)
+
+  def emit(self, evt):
+    for callback in self.callbacks:
+      callback(evt)
+
+
+class StubSpeechConfig:
+
+  def __init__(self, subscription: str, region: str):
+    pass
+
+  def set_speech_synthesis_output_format(self, output_format):
+    pass
+
+
+class StubResultFuture:
+  """Resolves to the request's result once synthesis starts on it."""
+
+  def __init__(self):
+    self.started = threading.Event()
+    self.result = None
+
+  def set_result(self, result):
+    self.result = result
+    self.started.set()
+
+  def get(self):
+    self.started.wait()
+    return self.result
+
+
+class StubSpeechSynthesizer:
+  """Synthesizes queued requests in order, faster than real time.
+
+  With drop_queued_on_stop, stopping also cancels every queued request, whose
+  futures then resolve as canceled without any events.
+  """
+
+  first_byte_ms = 300
+  speedup = 5
+  drop_queued_on_stop = False
+
+  def __init__(self, speech_config: StubSpeechConfig, audio_config=None):
+    self.synthesis_started = StubSignal()
+    self.synthesizing = StubSignal()
+    self.synthesis_word_boundary = StubSignal()
+    self.synthesis_completed = StubSignal()
+    self.synthesis_canceled = StubSignal()
+    self.requests: queue.Queue[tuple[str, str,
+                                     StubResultFuture]] = queue.Queue()
+    self.stop_current = threading.Event()
+    self.completed = 0
+    self.canceled = 0
+    threading.Thread(target=self.run, daemon=True).start()
+
+  def start_speaking_ssml_async(self, ssml: str) -> StubResultFuture:
+    future = StubResultFuture()
+    self.requests.put((uuid.uuid4().hex, ssml, future))
+    return future
+
+  def stop_speaking_async(self):
+    self.stop_current.set()
+    while self.drop_queued_on_stop and not self.requests.empty():
+      result_id, _, future = self.requests.get_nowait()
+      self.canceled += 1
+      future.set_result(
+        self.create_result(result_id, speechsdk.ResultReason.Canceled))
+
+  def create_result(self,
+                    result_id: str,
+                    reason: speechsdk.ResultReason,
+                    audio_data: bytes = b""):
+    return SimpleNamespace(
+      result_id=result_id,
+      reason=reason,
+      audio_data=audio_data,
+      cancellation_details=SimpleNamespace(reason="stopped"),
+    )
+
+  def run(self):
+    while True:
+      result_id, ssml, future = self.requests.get()
+      self.stop_current.clear()
+      text = "".join(ElementTree.fromstring(ssml).itertext())
+      time.sleep(self.first_byte_ms / 1000)
+      started = self.create_result(
+        result_id, speechsdk.ResultReason.SynthesizingAudioStarted)
+      self.synthesis_started.emit(SimpleNamespace(result=started))
+      future.set_result(started)
+      audio_offset = 0.0
+      text_offset = ssml.index(text)
+      for word in text.split():
+        if self.stop_current.is_set():
+          self.canceled += 1
+          self.synthesis_canceled.emit(
+            SimpleNamespace(result=self.create_result(
+              result_id, speechsdk.ResultReason.Canceled)))
+          break
+        text_offset = ssml.index(word, text_offset)
+        self.synthesis_word_boundary.emit(
+          SimpleNamespace(
+            result_id=result_id,
+            text=word,
+            text_offset=text_offset,
+            audio_offset=int(audio_offset * 10_000_000),
+            boundary_type=None,
+          ))
+        time.sleep(WORD_SECONDS / self.speedup)
+        self.synthesizing.emit(
+          SimpleNamespace(result=self.create_result(
+            result_id,
+            speechsdk.ResultReason.SynthesizingAudio,
+            MULAW_SILENCE * int(WORD_SECONDS * DEFAULT_SAMPLING_RATE),
+          )))
+        audio_offset += WORD_SECONDS
+      else:
+        self.completed += 1
+        self.synthesis_completed.emit(
+          SimpleNamespace(result=self.create_result(
+            result_id, speechsdk.ResultReason.SynthesizingAudioCompleted)))
+
+
+class SentencesAgent(BaseAgent):
+
+  def __init__(self, agent_config: AgentConfig, sentences: int):
+    super().__init__(agent_config)
+    self.sentences = sentences
+
+  def generate_response(self,
+                        human_input,
+                        is_interrupt: bool = False) -> Generator:
+    for i in range(self.sentences):
+      yield f"{SENTENCE} Number {i + 1}."
+
+
+class NullOutputDevice:
+
+  async def send_async(self, chunk: bytes):
+    pass
+
+
+def create_conversation(sentences: int,
+                        lookahead: int) -> StreamingConversation:
+  call_config = create_call_config()
+  synthesizer = AzureSynthesizer(
+    AzureSynthesizerConfig(
+      sampling_rate=DEFAULT_SAMPLING_RATE,
+      audio_encoding=AudioEncoding.MULAW,
+    ))
+  # nothing should come from or go to the synthesis cache
+  synthesizer.is_cacheable = lambda: False
+  return StreamingConversation(
+    NullOutputDevice(),
+    StubTranscriber(call_config.transcriber_config),
+    SentencesAgent(
+      AgentConfig(generate_responses=True,
+                  initial_message=BaseMessage(text="Hi.")), sentences),
+    synthesizer,
+    synthesis_lookahead=lookahead,
+  )
+
+
+async def wait_for_messages(conversation: StreamingConversation, count: int):
+  while len(conversation.transcript.messages) < count:
+    await asyncio.sleep(0.005)
+
+
+async def measure_silence(sentences: int, lookahead: int) -> float:
+  """Playback time of the reply beyond the audio it contains."""
+  conversation = create_conversation(sentences, lookahead)
+  await conversation.start()
+  # the greeting, once listed and once played
+  await wait_for_messages(conversation, 2)
+  conversation.transcriber.pending.put_nowait(Transcription("hi", 0.9, True))
+  await wait_for_messages(conversation, 4)
+  finished_at = time.time()
+  conversation.terminate()
+  audio_seconds = sentences * len(
+    f"{SENTENCE} Number 1.".split()) * WORD_SECONDS
+  # each chunk hands back this much of its playback time
+  allowance = conversation.per_chunk_allowance_seconds * sentences * 2
+  first_audio = conversation.trace.turns[-1][FIRST_AUDIO_SENT]
+  return max(finished_at - first_audio - audio_seconds + allowance, 0)
+
+
+async def measure_interrupt(sentences: int, lookahead: int) -> tuple[int, int]:
+  """Requests finished and stopped after a cut-off on the first sentence."""
+  conversation = create_conversation(sentences, lookahead)
+  await conversation.start()
+  await wait_for_messages(conversation, 2)
+  speech = conversation.synthesizer.synthesizer
+  conversation.transcriber.pending.put_nowait(Transcription("hi", 0.9, True))
+  while (len(conversation.trace.turns) < 2
+         or FIRST_AUDIO_SENT not in conversation.trace.turns[1]):
+    await asyncio.sleep(0.005)
+  completed, canceled = speech.completed, speech.canceled
+  conversation.interrupt_all_synthesis()
+  await wait_for_messages(conversation, 4)
+  # everything still queued at Azure has been worked through by now
+  await asyncio.sleep(sentences * (StubSpeechSynthesizer.first_byte_ms / 1000 +
+                                   1 / StubSpeechSynthesizer.speedup))
+  conversation.terminate()
+  return speech.completed - completed, speech.canceled - canceled
+
+
+async def main_async(args):
+  StubSpeechSynthesizer.first_byte_ms = args.first_byte_ms
+  StubSpeechSynthesizer.drop_queued_on_stop = args.drop_queued_on_stop
+  print(f"{args.sentences} sentences of "
+        f"{len(SENTENCE.split()) + 2} words, {args.first_byte_ms} ms to "
+        f"first byte, synthesized {StubSpeechSynthesizer.speedup}x real time")
+  print(f"{'lookahead':>9} {'silence':>9} {'finished':>9} {'stopped':>8}")
+  for lookahead in args.lookahead:
+    silence = await measure_silence(args.sentences, lookahead)
+    completed, canceled = await measure_interrupt(args.sentences, lookahead)
+    print(f"{lookahead:>9} {1000 * silence:>7.0f}ms "
+          f"{completed:>9} {canceled:>8}")
+  speech = create_conversation(args.sentences, 0).synthesizer.synthesizer
+  print("word boundary callbacks per synthesizer: "
+        f"{len(speech.synthesis_word_boundary.callbacks)}")
+
+
+def main(argv: Optional[list[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--sentences", type=int, default=4)
+  parser.add_argument("--first-byte-ms", type=int, default=300)
+  parser.add_argument("--drop-queued-on-stop", action="store_true")
+  parser.add_argument("--lookahead",
+                      type=int,
+                      nargs="+",
+                      default=[0, 1, 2])
+  asyncio.run(main_async(parser.parse_args(argv)))
+
+
+# the native SDK can't start without Azure's platform libraries and network
+speechsdk.SpeechConfig = StubSpeechConfig
+speechsdk.SpeechSynthesizer = StubSpeechSynthesizer
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,339 @@
+"""Load benchmark for concurrent phone calls.
+
+Starts the call server in a child process with stub transcriber, agent and
+synthesizer, then drives N fake Twilio media streams against
+/connect_call/{id} and reports server CPU per call and the jitter between
+consecutive audio frames the server sends back.
+
+  python -m benchmarks.call_load --calls 50 --seconds 20
+  python -m benchmarks.call_load --calls 50 --implementation vocode
+"""
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import statistics
+import time
+from types import SimpleNamespace
+from typing import Generator, Optional
+
+import requests
+import uvicorn
+import websockets
+from vocode.streaming.agent.base_agent import BaseAgent
+from vocode.streaming.models.agent import AgentConfig
+from vocode.streaming.models.audio_encoding import AudioEncoding
+from vocode.streaming.models.message import BaseMessage
+from vocode.streaming.models.synthesizer import SynthesizerConfig
+from vocode.streaming.models.telephony import CallConfig, TwilioConfig
+from vocode.streaming.models.transcriber import TranscriberConfig
+from vocode.streaming.output_device.twilio_output_device import TwilioOutputDevice
+from vocode.streaming.streaming_conversation import (
+  StreamingConversation as VocodeStreamingConversation, )
+from vocode.streaming.synthesizer.base_synthesizer import (
+  BaseSynthesizer,
+  SynthesisResult,
+)
+from vocode.streaming.telephony.constants import (
+  DEFAULT_AUDIO_ENCODING,
+  DEFAULT_CHUNK_SIZE,
+  DEFAULT_SAMPLING_RATE,
+)
+from vocode.streaming.telephony.conversation import call as vocode_call
+from vocode.streaming.transcriber.base_transcriber import (
+  BaseTranscriber,
+  Transcription,
+)
+
+from call_server.call import Call
+from call_server.metrics import get_metrics
+from call_server.server import CallsRouter, ConfigManager
+
+FRAME_SECONDS = 0.02
+FRAME_BYTES = 160
+# the stub transcriber finalises an utterance after this much caller audio
+UTTERANCE_SECONDS = 8
+RESPONSE_SECONDS = 3
+CHUNK_SECONDS = 1
+
+
+class StubTranscriber(BaseTranscriber):
+
+  def __init__(self, transcriber_config: TranscriberConfig):
+    super().__init__(transcriber_config)
+    self.received = 0
+    self.utterance_bytes = int(UTTERANCE_SECONDS * DEFAULT_SAMPLING_RATE)
+    self.pending: asyncio.Queue[Transcription] = asyncio.Queue()
+
+  async def run(self):
+    while True:
+      await self.on_response(await self.pending.get())
+
+  def send_audio(self, chunk):
+    self.received += len(chunk)
+    if self.received >= self.utterance_bytes:
+      self.received = 0
+      self.pending.put_nowait(Transcription("how are you", 0.9, True))
+
+
+class StubAgent(BaseAgent):
+
+  def respond(self, human_input, is_interrupt: bool = False):
+    return "I am doing well.", False
+
+  def generate_response(self,
+                        human_input,
+                        is_interrupt: bool = False) -> Generator:
+    yield "I am doing well."
+    yield "Thanks for asking!"
+
+
+class StubSynthesizer(BaseSynthesizer):
+
+  def create_speech(self, message: BaseMessage, chunk_size: int,
+                    bot_sentiment=None) -> SynthesisResult:
+    audio = b"\xff" * (RESPONSE_SECONDS * DEFAULT_SAMPLING_RATE)
+
+    def chunk_generator():
+      for i in range(0, len(audio), chunk_size):
+        yield SynthesisResult.ChunkResult(audio[i:i + chunk_size],
+                                          i + chunk_size >= len(audio))
+
+    return SynthesisResult(chunk_generator(), lambda seconds: message.text)
+
+
+class FakeTwilioClient:
+
+  def calls(self, sid):
+    return SimpleNamespace(
+      fetch=lambda: SimpleNamespace(answered_by=None),
+      update=lambda status: SimpleNamespace(status=status),
+    )
+
+
+def create_stubs(call_config: CallConfig):
+  return dict(
+    transcriber=StubTranscriber(call_config.transcriber_config),
+    agent=StubAgent(call_config.agent_config),
+    synthesizer=StubSynthesizer(call_config.synthesizer_config),
+  )
+
+
+class StubCall(Call):
+
+  def __init__(self, **kwargs):
+    super().__init__(**kwargs)
+    self.twilio_client = FakeTwilioClient()
+
+
+class VocodeStubCall(vocode_call.Call):
+  """Stock vocode Call (one thread and loop per call) wired to the stubs."""
+
+  def __init__(self, base_url, config_manager, transcriber, agent,
+               synthesizer, twilio_config, twilio_sid, conversation_id,
+               logger):
+    self.base_url = base_url
+    self.config_manager = config_manager
+    self.twilio_config = twilio_config
+    self.output_device = TwilioOutputDevice()
+    self.twilio_client = FakeTwilioClient()
+    VocodeStreamingConversation.__init__(
+      self,
+      self.output_device,
+      transcriber,
+      agent,
+      synthesizer,
+      conversation_id=conversation_id,
+      per_chunk_allowance_seconds=0.01,
+      logger=logger,
+    )
+    self.twilio_sid = twilio_sid
+    self.latest_media_timestamp = 0
+
+
+class StubCallsRouter(CallsRouter):
+
+  def __init__(self, implementation: str, **kwargs):
+    super().__init__(**kwargs)
+    self.call_class = (StubCall if implementation == "call_server" else
+                       VocodeStubCall)
+
+  def create_call(self, id: str, call_config: CallConfig):
+    return self.call_class(
+      base_url=self.base_url,
+      config_manager=self.config_manager,
+      twilio_config=call_config.twilio_config,
+      twilio_sid=call_config.twilio_sid,
+      conversation_id=id,
+      logger=self.logger,
+      **create_stubs(call_config),
+    )
+
+
+def create_call_config() -> CallConfig:
+  return CallConfig(
+    transcriber_config=TranscriberConfig(
+      sampling_rate=DEFAULT_SAMPLING_RATE,
+      audio_encoding=DEFAULT_AUDIO_ENCODING,
+      chunk_size=DEFAULT_CHUNK_SIZE,
+    ),
+    agent_config=AgentConfig(
+      initial_message=BaseMessage(text="Hey! What's up?")),
+    synthesizer_config=SynthesizerConfig(
+      sampling_rate=DEFAULT_SAMPLING_RATE,
+      audio_encoding=AudioEncoding.MULAW,
+    ),
+    twilio_config=TwilioConfig(account_sid="AC-benchmark", auth_token="x"),
+    twilio_sid="CA-benchmark",
+  )
+
+
+def serve(port: int, num_calls: int, implementation: str):
+  from fastapi import FastAPI, Response
+
+  config_manager = ConfigManager()
+  for i in range(num_calls):
+    config_manager.save_config(f"call-{i}", create_call_config())
+  app = FastAPI()
+  app.include_router(
+    StubCallsRouter(
+      implementation,
+      base_url=f"127.0.0.1:{port}",
+      config_manager=config_manager,
+    ).get_router())
+  app.get("/cpu")(lambda: {"cpu": time.process_time()})
+  app.get("/metrics")(lambda: Response(content=get_metrics().render(),
+                                       media_type="text/plain"))
+  uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def drive_call(port: int, id: str, seconds: float,
+                     arrivals: list[float]):
+  async with websockets.connect(
+      f"ws://127.0.0.1:{port}/connect_call/{id}") as ws:
+    await ws.send(
+      json.dumps({
+        "event": "start",
+        "start": {
+          "streamSid": f"MZ-{id}"
+        }
+      }))
+
+    async def receiver():
+      async for message in ws:
+        if json.loads(message)["event"] == "media":
+          arrivals.append(time.monotonic())
+
+    receiver_task = asyncio.create_task(receiver())
+    payload = base64.b64encode(b"\xff" * FRAME_BYTES).decode("utf-8")
+    start = time.monotonic()
+    frame = 0
+    while time.monotonic() - start < seconds:
+      await ws.send(
+        json.dumps({
+          "event": "media",
+          "media": {
+            "timestamp": str(frame * 20),
+            "payload": payload
+          },
+        }))
+      frame += 1
+      await asyncio.sleep(max(start + frame * FRAME_SECONDS - time.monotonic(),
+                              0))
+    await ws.send(json.dumps({"event": "stop"}))
+    receiver_task.cancel()
+
+
+def summarize_jitter(arrivals_per_call: list[list[float]]) -> list[float]:
+  jitter_ms = []
+  for arrivals in arrivals_per_call:
+    for previous, current in zip(arrivals, arrivals[1:]):
+      delta = current - previous
+      # consecutive chunks of one response; longer gaps are turn boundaries
+      if delta < CHUNK_SECONDS * 1.5:
+        jitter_ms.append(abs(delta - CHUNK_SECONDS) * 1000)
+  return jitter_ms
+
+
+async def run_load(port: int, num_calls: int, seconds: float):
+  arrivals_per_call = [[] for _ in range(num_calls)]
+  cpu_start = requests.get(f"http://127.0.0.1:{port}/cpu").json()["cpu"]
+  wall_start = time.monotonic()
+  await asyncio.gather(*(drive_call(port, f"call-{i}", seconds,
+                                    arrivals_per_call[i])
+                         for i in range(num_calls)))
+  wall = time.monotonic() - wall_start
+  cpu = requests.get(f"http://127.0.0.1:{port}/cpu").json()["cpu"] - cpu_start
+  metrics = requests.get(f"http://127.0.0.1:{port}/metrics").text
+  return cpu, wall, arrivals_per_call, metrics
+
+
+def get_histogram_mean(metrics: str, name: str) -> Optional[float]:
+  values = {}
+  for line in metrics.splitlines():
+    for suffix in ("sum", "count"):
+      if line.startswith(f"call_server_{name}_{suffix} "):
+        values[suffix] = float(line.split()[1])
+  if values.get("count"):
+    return values["sum"] / values["count"]
+  return None
+
+
+def wait_for_server(port: int, timeout: float = 30):
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    try:
+      requests.get(f"http://127.0.0.1:{port}/cpu")
+      return
+    except requests.ConnectionError:
+      time.sleep(0.1)
+  raise TimeoutError("benchmark server did not start")
+
+
+def main(argv: Optional[list[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--calls", type=int, default=20)
+  parser.add_argument("--seconds", type=float, default=15)
+  parser.add_argument("--port", type=int, default=3100)
+  parser.add_argument("--implementation",
+                      choices=["call_server", "vocode"],
+                      default="call_server")
+  args = parser.parse_args(argv)
+
+  server = multiprocessing.Process(
+    target=serve,
+    args=(args.port, args.calls, args.implementation),
+    daemon=True,
+  )
+  server.start()
+  try:
+    wait_for_server(args.port)
+    cpu, wall, arrivals_per_call, metrics = asyncio.run(
+      run_load(args.port, args.calls, args.seconds))
+  finally:
+    server.terminate()
+    server.join()
+
+  jitter_ms = summarize_jitter(arrivals_per_call)
+  frames = sum(len(arrivals) for arrivals in arrivals_per_call)
+  print(f"implementation:     {args.implementation}")
+  print(f"calls:              {args.calls} for {wall:.1f}s")
+  print(f"server cpu:         {cpu:.2f}s "
+        f"({100 * cpu / wall:.1f}% of a core)")
+  print(f"cpu per call:       {100 * cpu / wall / args.calls:.2f}% of a core")
+  print(f"frames sent:        {frames}")
+  if jitter_ms:
+    jitter_ms.sort()
+    print(f"frame jitter (ms):  mean {statistics.mean(jitter_ms):.1f}, "
+          f"p50 {jitter_ms[len(jitter_ms) // 2]:.1f}, "
+          f"p99 {jitter_ms[int(len(jitter_ms) * 0.99)]:.1f}, "
+          f"max {jitter_ms[-1]:.1f}")
+  # only call_server's conversations are traced
+  response_latency = get_histogram_mean(metrics, "response_latency_seconds")
+  if response_latency is not None:
+    print(f"response latency:   mean {1000 * response_latency:.0f}ms")
+
+
+if __name__ == "__main__":
+  main()
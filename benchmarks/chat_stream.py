@@ -0,0 +1,179 @@
+"""Streams ChatGPT responses from a local SSE stub server.
+
+Compares vocode's per-turn SSEClient generator, iterated on the event loop as
+vocode's StreamingConversation does, against call_server.agent's pooled async
+path: time to first token, time to the first chunk handed to synthesis, how
+long the event loop was stalled, and how many TCP connections were opened.
+
+  python -m benchmarks.chat_stream --turns 10 --token-ms 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from typing import Optional
+
+from aiohttp import web
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+
+from langchain.schema import ChatMessage
+from vocode.streaming.agent.utils import stream_llm_response
+from vocode.streaming.models.agent import ChatGPTAgentConfig
+from vocode.streaming.utils.sse_client import SSEClient
+
+from call_server.agent import ChatGPTAgent, close_http_session
+
+RESPONSE = ("Sure, I can help you with that, and if you give me a moment "
+            "I will look up the opening hours for the store near you. "
+            "It opens at nine.")
+
+
+class StubChatServer:
+  """Streams RESPONSE one word per token, like /v1/chat/completions."""
+
+  def __init__(self, first_token_ms: int, token_ms: int):
+    self.first_token_ms = first_token_ms
+    self.token_ms = token_ms
+    self.connections = set()
+
+  async def chat_completions(self, request: web.Request):
+    self.connections.add(id(request.transport))
+    await request.json()
+    response = web.StreamResponse(
+      headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    await asyncio.sleep(self.first_token_ms / 1000)
+    words = RESPONSE.split(" ")
+    for i, word in enumerate(words):
+      token = word if i == 0 else f" {word}"
+      event = {"choices": [{"delta": {"content": token}, "finish_reason": None}]}
+      await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+      await asyncio.sleep(self.token_ms / 1000)
+    event = {"choices": [{"delta": {}, "finish_reason": "stop"}]}
+    await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+  def start(self, port: int):
+    # its own loop in a thread: the vocode path blocks the client's loop
+    started = threading.Event()
+
+    async def serve():
+      app = web.Application()
+      app.router.add_post("/v1/chat/completions", self.chat_completions)
+      runner = web.AppRunner(app)
+      await runner.setup()
+      await web.TCPSite(runner, "localhost", port).start()
+      started.set()
+      await asyncio.Event().wait()
+
+    threading.Thread(target=asyncio.run, args=(serve(), ), daemon=True).start()
+    started.wait()
+
+
+def vocode_generate_response(api_base: str, agent_config: ChatGPTAgentConfig,
+                             human_input: str):
+  # ChatGPTAgent.generate_response with the URL pointed at the stub
+  messages = SSEClient(
+    "POST",
+    f"{api_base}/chat/completions",
+    headers={"Content-Type": "application/json"},
+    json={
+      "model":
+      agent_config.model_name,
+      "messages": [
+        ChatMessage(role="user", content=human_input).dict(include={
+          "content": True,
+          "role": True
+        })
+      ],
+      "stream":
+      True,
+    },
+  )
+  return stream_llm_response(
+    map(lambda event: json.loads(event.data), messages),
+    get_text=lambda choice: choice.get("delta", {}).get("content"),
+  )
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list[float]):
+  while True:
+    start = time.perf_counter()
+    await asyncio.sleep(0.005)
+    lags.append(time.perf_counter() - start - 0.005)
+    if stop.is_set():
+      return
+
+
+async def run_turns(name: str, turns: int, generate) -> dict:
+  first_chunks, lags = [], []
+  stop = asyncio.Event()
+  lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+  await asyncio.sleep(0)
+  for _ in range(turns):
+    start = time.perf_counter()
+    first_chunk = None
+    async for _ in generate():
+      if first_chunk is None:
+        first_chunk = time.perf_counter() - start
+    first_chunks.append(first_chunk)
+  stop.set()
+  await lag_task
+  return {
+    "name": name,
+    "first_chunk_ms": 1000 * statistics.median(first_chunks),
+    "max_loop_lag_ms": 1000 * max(lags),
+  }
+
+
+async def main_async(args):
+  server = StubChatServer(args.first_token_ms, args.token_ms)
+  server.start(args.port)
+  api_base = f"http://localhost:{args.port}/v1"
+  agent_config = ChatGPTAgentConfig(prompt_preamble="Be helpful.",
+                                    generate_responses=True)
+
+  async def vocode_generate():
+    # iterated directly on the loop, as vocode's conversation does
+    for message in vocode_generate_response(api_base, agent_config, "Hi"):
+      yield message
+
+  server.connections.clear()
+  results = [await run_turns("vocode", args.turns, vocode_generate)]
+  connections = [len(server.connections)]
+
+  agent = ChatGPTAgent(agent_config, api_base=api_base)
+  server.connections.clear()
+  results.append(await run_turns(
+    "call_server", args.turns,
+    lambda: agent.generate_response_async("Hi")))
+  connections.append(len(server.connections))
+  await close_http_session()
+
+  print(f"{args.turns} turns, first token after {args.first_token_ms} ms, "
+        f"then one every {args.token_ms} ms")
+  print(f"{'path':12} {'first chunk':>12} {'loop stall':>11} {'connections':>12}")
+  for result, num_connections in zip(results, connections):
+    print(f"{result['name']:12} {result['first_chunk_ms']:>10.0f}ms "
+          f"{result['max_loop_lag_ms']:>9.0f}ms {num_connections:>12}")
+  ttft = 1000 * statistics.median(agent.times_to_first_token)
+  print(f"call_server time to first token: {ttft:.0f}ms")
+
+
+def main(argv: Optional[list[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--turns", type=int, default=10)
+  parser.add_argument("--first-token-ms", type=int, default=200)
+  parser.add_argument("--token-ms", type=int, default=30)
+  parser.add_argument("--port", type=int, default=3100)
+  asyncio.run(main_async(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+  main()
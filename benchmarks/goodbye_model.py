@@ -0,0 +1,91 @@
+"""Goodbye detection on labelled caller turns.
+
+A positive ends the live call, so every non-goodbye below must come back
+negative; that includes questions and mid-sentence uses of a goodbye
+phrase. Reports each mistake and the time per utterance, and exits non-zero
+if there is any mistake, so the default model can be checked before it
+ships.
+
+  python -m benchmarks.goodbye_model
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+from call_server.goodbye_model import BaseGoodbyeModel, get_goodbye_model
+
+GOODBYES = [
+  "bye",
+  "goodbye",
+  "okay bye bye",
+  "thanks John, bye",
+  "see you later",
+  "see you",
+  "talk to you later",
+  "talk to you soon",
+  "okay thank you so much, talk to you later",
+  "have a good day",
+  "have a nice day",
+  "you have a good day too",
+  "thank you, have a great day",
+  "alright, good night",
+  "take care",
+  "I have to go now",
+  "I gotta go",
+  "ok thanks, I need to go",
+]
+
+NOT_GOODBYES = [
+  "did you have a good day",
+  "have a good idea",
+  "talk to you later about the refund",
+  "can I talk to you later today",
+  "I have to go to the doctor tomorrow, can you remind me",
+  "what time does the store close",
+  "good morning",
+  "thank you",
+  "okay",
+  "you too",
+  "see you at the meeting on Monday",
+  "how was your night",
+  "I want to take care of my bill",
+  "where do I have to go to pick it up",
+  "",
+]
+
+
+async def classify(model: BaseGoodbyeModel,
+                   utterances: list[str]) -> tuple[list[bool], float]:
+  """Results, and the mean seconds per utterance."""
+  start = time.perf_counter()
+  results = [await model.is_goodbye(utterance) for utterance in utterances]
+  return results, (time.perf_counter() - start) / len(utterances)
+
+
+async def main_async(args) -> int:
+  model = get_goodbye_model()
+  utterances = GOODBYES + NOT_GOODBYES
+  expected = [True] * len(GOODBYES) + [False] * len(NOT_GOODBYES)
+  for _ in range(args.warmup):
+    await classify(model, utterances)
+  results, seconds = await classify(model, utterances)
+  mistakes = 0
+  for utterance, result, is_goodbye in zip(utterances, results, expected):
+    if result != is_goodbye:
+      mistakes += 1
+      label = "missed goodbye" if is_goodbye else "false hang-up"
+      print(f"{label:15} {utterance!r}")
+  print(f"{type(model).__name__}: {len(utterances) - mistakes}/"
+        f"{len(utterances)} correct, {1e6 * seconds:.0f} us per utterance")
+  return 1 if mistakes else 0
+
+
+def main(argv: Optional[list[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--warmup", type=int, default=1)
+  raise SystemExit(asyncio.run(main_async(parser.parse_args(argv))))
+
+
+if __name__ == "__main__":
+  main()
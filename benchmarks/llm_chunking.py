@@ -0,0 +1,73 @@
+"""Where streamed ChatGPT responses are split for synthesis.
+
+Feeds responses through call_server.agent.stream_llm_response_async, with
+tokens cut the way ChatGPT cuts them (digits and punctuation are tokens of
+their own), and checks the chunks against the expected split. Each chunk
+is synthesized on its own, so a split inside "1,200" or "9:30" reads the
+number out in two halves. Exits non-zero if any response is split
+differently than expected.
+
+  python -m benchmarks.llm_chunking
+"""
+import argparse
+import asyncio
+import re
+from typing import AsyncGenerator, Optional
+
+from call_server.agent import stream_llm_response_async
+
+CASES = [
+  ("Your total comes to about 1,200 dollars.",
+   ["Your total comes to about 1,200 dollars."]),
+  ("We open at 9:30 tomorrow.", ["We open at 9:30 tomorrow."]),
+  ("The store near you opens at 10:00, and closes at 8.",
+   ["The store near you opens at 10:00,", "and closes at 8."]),
+  ("The new plan costs 3,500, which is less than last year.",
+   ["The new plan costs 3,500,", "which is less than last year."]),
+  ("Sure, I can help you with that, and I will look it up.",
+   ["Sure, I can help you with that,", "and I will look it up."]),
+  ("Here is what you need: your card and your ID.",
+   ["Here is what you need:", "your card and your ID."]),
+]
+
+_TOKEN_PATTERN = re.compile(r"\s?[A-Za-z']+|\s?\d+|\s?[^\w\s]")
+
+
+def tokenize(text: str) -> list[str]:
+  return _TOKEN_PATTERN.findall(text)
+
+
+async def stream_events(tokens: list[str]) -> AsyncGenerator[dict, None]:
+  for token in tokens:
+    yield {"choices": [{"text": token, "finish_reason": None}]}
+  yield {"choices": [{"text": "", "finish_reason": "stop"}]}
+
+
+async def split(text: str) -> list[str]:
+  return [
+    chunk.strip()
+    async for chunk in stream_llm_response_async(stream_events(tokenize(text)))
+  ]
+
+
+async def main_async(args) -> int:
+  mistakes = 0
+  for text, expected in CASES:
+    chunks = await split(text)
+    if chunks != expected:
+      mistakes += 1
+      print(f"unexpected split {' | '.join(chunks)!r}")
+    elif args.verbose:
+      print(f"ok               {' | '.join(chunks)!r}")
+  print(f"{len(CASES) - mistakes}/{len(CASES)} responses split as expected")
+  return 1 if mistakes else 0
+
+
+def main(argv: Optional[list[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--verbose", action="store_true")
+  raise SystemExit(asyncio.run(main_async(parser.parse_args(argv))))
+
+
+if __name__ == "__main__":
+  main()
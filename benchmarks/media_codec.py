@@ -0,0 +1,164 @@
+"""Microbenchmark of the Twilio media path: frames per second per core.
+
+Compares vocode's per-frame code (json + base64 + audioop) against
+call_server.media_codec on 20 ms Twilio frames, and the transcriber's
+PCM16 downsampling on 20 ms and 1 s chunks.
+
+  python -m benchmarks.media_codec --seconds 2
+"""
+import argparse
+import audioop
+import base64
+import json
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from call_server.media_codec import (
+  FRAME_MS,
+  InboundAudioBuffer,
+  MediaFrameEncoder,
+  Resampler,
+  parse_media_frame,
+)
+from call_server.transcriber import RESAMPLER_MIN_CHUNK_MS
+
+STREAM_SID = "MZ18ad3ab5a668481ce02b83e7395059f0"
+FRAME_BYTES = 160
+
+
+def create_inbound_messages(num_frames: int) -> list[str]:
+  rng = np.random.default_rng(0)
+  messages = []
+  for i in range(num_frames):
+    # every 50th frame arrives late so the gap-filling path is exercised
+    timestamp = i * FRAME_MS + (FRAME_MS if i % 50 == 49 else 0)
+    messages.append(
+      json.dumps(
+        {
+          "event": "media",
+          "sequenceNumber": str(i + 2),
+          "media": {
+            "track": "inbound",
+            "chunk": str(i + 1),
+            "timestamp": str(timestamp),
+            "payload": base64.b64encode(
+              rng.integers(0, 256, FRAME_BYTES,
+                           dtype=np.uint8).tobytes()).decode("utf-8"),
+          },
+          "streamSid": STREAM_SID,
+        },
+        separators=(",", ":"),
+      ))
+  return messages
+
+
+def vocode_inbound(messages: list[str]):
+  latest_media_timestamp = 0
+  for message in messages:
+    data = json.loads(message)
+    if data["event"] == "media":
+      media = data["media"]
+      base64.b64decode(media["payload"])
+      if latest_media_timestamp + 20 < int(media["timestamp"]):
+        bytes_to_fill = 8 * (int(media["timestamp"]) -
+                             (latest_media_timestamp + 20))
+        _ = b"\xff" * bytes_to_fill
+      latest_media_timestamp = int(media["timestamp"])
+
+
+def call_server_inbound(messages: list[str], coalesce_ms: int = 0):
+  inbound_audio = InboundAudioBuffer(coalesce_ms=coalesce_ms)
+  for message in messages:
+    frame = parse_media_frame(message)
+    if frame:
+      inbound_audio.add(frame)
+
+
+def vocode_outbound(chunks: list[bytes]):
+  for chunk in chunks:
+    json.dumps({
+      "event": "media",
+      "streamSid": STREAM_SID,
+      "media": {
+        "payload": base64.b64encode(chunk).decode("utf-8")
+      },
+    })
+
+
+def call_server_outbound(chunks: list[bytes]):
+  encoder = MediaFrameEncoder(STREAM_SID)
+  for chunk in chunks:
+    encoder.encode(chunk)
+
+
+def vocode_resample(chunks: list[bytes]):
+  for chunk in chunks:
+    # vocode passes no state, so every chunk restarts the filter
+    audioop.ratecv(chunk, 2, 1, 24000, 8000, None)
+
+
+def call_server_resample(chunks: list[bytes]):
+  # what DeepgramTranscriber.send_audio picks for chunks this size
+  if len(chunks[0]) >= 2 * 24 * RESAMPLER_MIN_CHUNK_MS:
+    resampler = Resampler(24000, 8000)
+    for chunk in chunks:
+      resampler.process(chunk)
+    return
+  state = None
+  for chunk in chunks:
+    _, state = audioop.ratecv(chunk, 2, 1, 24000, 8000, state)
+
+
+def measure(fn: Callable, arg, num_frames: int, seconds: float) -> float:
+  """20 ms frames processed per CPU second."""
+  frames = 0
+  start = time.process_time()
+  while time.process_time() - start < seconds:
+    fn(arg)
+    frames += num_frames
+  return frames / (time.process_time() - start)
+
+
+def main(argv: Optional[list[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--frames", type=int, default=1000)
+  parser.add_argument("--seconds", type=float, default=2)
+  args = parser.parse_args(argv)
+
+  inbound_messages = create_inbound_messages(args.frames)
+  rng = np.random.default_rng(1)
+  outbound_chunks = [
+    rng.integers(0, 256, FRAME_BYTES, dtype=np.uint8).tobytes()
+    for _ in range(args.frames)
+  ]
+  # 24 kHz PCM16 going to the transcriber at 8 kHz, as 20 ms frames and as
+  # one second chunks
+  pcm = rng.integers(-8000, 8000, 480 * args.frames, dtype=np.int16).tobytes()
+  pcm_frames = [pcm[i:i + 960] for i in range(0, len(pcm), 960)]
+  pcm_seconds = [pcm[i:i + 48000] for i in range(0, len(pcm), 48000)]
+
+  cases = [
+    ("inbound parse + gap fill", vocode_inbound, call_server_inbound,
+     inbound_messages),
+    ("inbound, coalesced to 100 ms", vocode_inbound,
+     lambda messages: call_server_inbound(messages, coalesce_ms=100),
+     inbound_messages),
+    ("outbound encode", vocode_outbound, call_server_outbound,
+     outbound_chunks),
+    ("24k -> 8k PCM16, 20 ms", vocode_resample, call_server_resample,
+     pcm_frames),
+    ("24k -> 8k PCM16, 1 s", vocode_resample, call_server_resample,
+     pcm_seconds),
+  ]
+  print(f"{'path':32} {'vocode':>14} {'call_server':>14} {'speedup':>8}")
+  for name, baseline, candidate, arg in cases:
+    baseline_fps = measure(baseline, arg, args.frames, args.seconds)
+    candidate_fps = measure(candidate, arg, args.frames, args.seconds)
+    print(f"{name:32} {baseline_fps:>12,.0f}/s {candidate_fps:>12,.0f}/s "
+          f"{candidate_fps / baseline_fps:>7.2f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,229 @@
+"""Response latency with and without speculative generation.
+
+Drives a StreamingConversation against the local ChatGPT SSE stub from
+benchmarks.chat_stream, with call_server's DeepgramTranscriber reading
+scripted Deepgram results from a stand-in websocket. Each turn sends one
+interim result per word while the caller talks, waits out the endpointing
+delay and then sends the final result, which either matches the last
+interim result (a hit) or adds a few words (a miss). Reports the time from
+final transcript to first audio, speculation counters, LLM requests made,
+and whether the agent's memory holds exactly the final turns.
+
+  python -m benchmarks.speculation --turns 5 --stable-ms 250 --endpointing-ms 600
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+from typing import Optional, Union
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+os.environ.setdefault("DEEPGRAM_API_KEY", "stub")
+
+from vocode.streaming.models.agent import ChatGPTAgentConfig
+from vocode.streaming.models.message import BaseMessage
+from vocode.streaming.models.transcriber import DeepgramTranscriberConfig
+from vocode.streaming.synthesizer.base_synthesizer import (
+  BaseSynthesizer,
+  SynthesisResult,
+)
+from vocode.streaming.telephony.constants import (
+  DEFAULT_AUDIO_ENCODING,
+  DEFAULT_CHUNK_SIZE,
+  DEFAULT_SAMPLING_RATE,
+)
+
+from benchmarks.call_load import create_call_config
+from benchmarks.chat_stream import StubChatServer
+from call_server.agent import ChatGPTAgent, close_http_session
+from call_server.metrics import (
+  FINAL_TRANSCRIPT,
+  FIRST_AUDIO_SENT,
+  SPECULATION_HITS,
+  SPECULATION_SAVED_SECONDS,
+  SPECULATIONS,
+)
+from call_server.streaming_conversation import StreamingConversation
+from call_server.transcriber import DeepgramTranscriber
+
+UTTERANCE = "what time does the store on main street open tomorrow"
+MISS_SUFFIX = "and when does it close"
+WORD_MS = 150
+# short, so a turn's reply has finished playing before the next one starts
+MESSAGE_AUDIO_SECONDS = 0.1
+
+
+class CountingChatServer(StubChatServer):
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.requests = 0
+
+  async def chat_completions(self, request):
+    self.requests += 1
+    return await super().chat_completions(request)
+
+
+class ShortSynthesizer(BaseSynthesizer):
+
+  def create_speech(self, message: BaseMessage, chunk_size: int,
+                    bot_sentiment=None) -> SynthesisResult:
+    audio = b"\xff" * int(MESSAGE_AUDIO_SECONDS * DEFAULT_SAMPLING_RATE)
+    return SynthesisResult(
+      iter([SynthesisResult.ChunkResult(audio, True)]),
+      lambda seconds: message.text,
+    )
+
+
+class ScriptedDeepgramSocket:
+  """Stands in for the Deepgram websocket: recv returns scripted results."""
+
+  def __init__(self):
+    self.results: asyncio.Queue[str] = asyncio.Queue()
+    self.start = 0.0
+
+  def push(self, transcript: str, is_final: bool, seconds: float):
+    words = transcript.split()
+    self.results.put_nowait(
+      json.dumps({
+        "is_final": is_final,
+        "speech_final": is_final,
+        "start": self.start,
+        "duration": seconds,
+        "channel": {
+          "alternatives": [{
+            "transcript": transcript,
+            "confidence": 0.9,
+            "words": [{
+              "word": word,
+              "start": self.start + i * seconds / len(words),
+              "end": self.start + (i + 1) * seconds / len(words),
+            } for i, word in enumerate(words)],
+          }]
+        },
+      }))
+    self.start += seconds
+
+  async def recv(self) -> str:
+    return await self.results.get()
+
+  async def send(self, data: Union[str, bytes]):
+    if isinstance(data, str) and json.loads(data).get("type") == "CloseStream":
+      # Deepgram ends the stream with a message that isn't a result
+      self.results.put_nowait(json.dumps({"type": "Metadata"}))
+
+  async def close(self):
+    pass
+
+
+class ScriptedDeepgramTranscriber(DeepgramTranscriber):
+
+  def __init__(self, socket: ScriptedDeepgramSocket):
+    # no endpointing config: Deepgram's speech_final ends the turn
+    super().__init__(
+      DeepgramTranscriberConfig(
+        sampling_rate=DEFAULT_SAMPLING_RATE,
+        audio_encoding=DEFAULT_AUDIO_ENCODING,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+      ))
+    self.socket = socket
+
+  async def connect(self) -> ScriptedDeepgramSocket:
+    return self.socket
+
+
+class NullOutputDevice:
+
+  async def send_async(self, chunk: bytes):
+    pass
+
+
+async def run_turn(conversation: StreamingConversation, endpointing_ms: int,
+                   final: str) -> float:
+  socket = conversation.transcriber.socket
+  words = UTTERANCE.split()
+  for i in range(1, len(words) + 1):
+    # Deepgram's interim results hold the whole segment spoken so far
+    socket.push(" ".join(words[:i]), False, WORD_MS / 1000)
+    await asyncio.sleep(WORD_MS / 1000)
+  await asyncio.sleep(endpointing_ms / 1000)
+  num_messages = len(conversation.transcript.messages)
+  socket.push(final, True, endpointing_ms / 1000)
+  # the caller's message and the bot's full reply
+  while len(conversation.transcript.messages) < num_messages + 2:
+    await asyncio.sleep(0.01)
+  turn = conversation.trace.turns[-1]
+  return turn[FIRST_AUDIO_SENT] - turn[FINAL_TRANSCRIPT]
+
+
+async def run_case(name: str, args, server: CountingChatServer,
+                   stable_ms: int, final: str):
+  call_config = create_call_config()
+  agent = ChatGPTAgent(
+    ChatGPTAgentConfig(
+      prompt_preamble="Be helpful.",
+      generate_responses=True,
+      initial_message=BaseMessage(text="Hi!"),
+    ),
+    api_base=f"http://localhost:{args.port}/v1",
+  )
+  conversation = StreamingConversation(
+    NullOutputDevice(),
+    ScriptedDeepgramTranscriber(ScriptedDeepgramSocket()),
+    agent,
+    ShortSynthesizer(call_config.synthesizer_config),
+    speculation_stable_ms=stable_ms,
+  )
+  await conversation.start()
+  requests = server.requests
+  latencies = [
+    await run_turn(conversation, args.endpointing_ms, final)
+    for _ in range(args.turns)
+  ]
+  conversation.terminate()
+
+  # every turn exactly once, after the greeting: the final transcript, then
+  # the reply
+  memory = agent.memory.chat_memory.messages[1:]
+  consistent = ([message.role for message in memory] == ["user", "assistant"]
+                * args.turns and all(message.content == final
+                                     for message in memory[::2]))
+  counters = conversation.trace.counters
+  print(f"{name:20} {1000 * statistics.median(latencies):>9.0f}ms "
+        f"{counters[SPECULATIONS]:>5} {counters[SPECULATION_HITS]:>5} "
+        f"{1000 * counters[SPECULATION_SAVED_SECONDS] / args.turns:>8.0f}ms "
+        f"{server.requests - requests:>9} {str(consistent):>7}")
+
+
+async def main_async(args):
+  # dropped speculations hang up mid-stream, which the stub logs as errors
+  logging.getLogger("aiohttp.server").setLevel(logging.CRITICAL)
+  server = CountingChatServer(args.first_token_ms, args.token_ms)
+  server.start(args.port)
+  print(f"{args.turns} turns, first token after {args.first_token_ms} ms, "
+        f"{args.endpointing_ms} ms endpointing, "
+        f"speculating after {args.stable_ms} ms")
+  print(f"{'case':20} {'response':>11} {'spec':>5} {'hits':>5} "
+        f"{'saved/turn':>10} {'requests':>9} {'memory':>7}")
+  await run_case("no speculation", args, server, 0, UTTERANCE)
+  await run_case("speculation, hits", args, server, args.stable_ms, UTTERANCE)
+  await run_case("speculation, misses", args, server, args.stable_ms,
+                 f"{UTTERANCE} {MISS_SUFFIX}")
+  await close_http_session()
+
+
+def main(argv: Optional[list[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--turns", type=int, default=5)
+  parser.add_argument("--stable-ms", type=int, default=250)
+  parser.add_argument("--endpointing-ms", type=int, default=600)
+  parser.add_argument("--first-token-ms", type=int, default=400)
+  parser.add_argument("--token-ms", type=int, default=30)
+  parser.add_argument("--port", type=int, default=3101)
+  asyncio.run(main_async(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+  main()
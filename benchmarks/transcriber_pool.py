@@ -0,0 +1,163 @@
+"""Answer-to-greeting latency with and without the transcriber pool.
+
+Runs against a local websocket stand-in for Deepgram's /v1/listen that
+delays each handshake, answers audio with empty interim results and, like
+Deepgram, closes streams that get no audio or KeepAlive for a while. Each
+call starts a conversation with stub agent and synthesizer and measures
+the time from the call being answered to the first greeting frame.
+
+  python -m benchmarks.transcriber_pool --calls 5 --handshake-ms 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+from typing import Optional
+
+import websockets
+
+# read by call_server.transcriber at import
+STUB_PORT = 3120
+os.environ.setdefault("DEEPGRAM_API_KEY", "stub")
+os.environ["DEEPGRAM_API_URL"] = f"ws://localhost:{STUB_PORT}/v1/listen"
+
+from vocode.streaming.models.transcriber import DeepgramTranscriberConfig
+from vocode.streaming.telephony.constants import (
+  DEFAULT_AUDIO_ENCODING,
+  DEFAULT_CHUNK_SIZE,
+  DEFAULT_SAMPLING_RATE,
+)
+
+from benchmarks.call_load import create_call_config, create_stubs
+from call_server.metrics import CALL_ANSWERED, FIRST_AUDIO_SENT
+from call_server.streaming_conversation import StreamingConversation
+from call_server.transcriber import DeepgramTranscriber
+from call_server.transcriber_pool import TranscriberPool
+
+
+class StubDeepgramServer:
+
+  def __init__(self, handshake_ms: int, idle_timeout: float):
+    self.handshake_ms = handshake_ms
+    self.idle_timeout = idle_timeout
+    self.connections = 0
+    self.idle_closes = 0
+
+  async def process_request(self, path, request_headers):
+    # stands in for DNS, TCP and TLS setup to the real API
+    await asyncio.sleep(self.handshake_ms / 1000)
+
+  async def handle(self, ws):
+    self.connections += 1
+    while True:
+      try:
+        message = await asyncio.wait_for(ws.recv(), self.idle_timeout)
+      except asyncio.TimeoutError:
+        self.idle_closes += 1
+        await ws.close(1011, "NET-0001")
+        return
+      except websockets.ConnectionClosed:
+        return
+      if isinstance(message, str):
+        if json.loads(message).get("type") == "CloseStream":
+          await ws.close()
+          return
+        continue
+      await ws.send(
+        json.dumps({
+          "is_final": False,
+          "speech_final": False,
+          "start": 0.0,
+          "duration": len(message) / DEFAULT_SAMPLING_RATE,
+          "channel": {
+            "alternatives": [{
+              "transcript": "",
+              "confidence": 0.0,
+              "words": []
+            }]
+          },
+        }))
+
+  def serve(self, port: int):
+    return websockets.serve(self.handle,
+                            "localhost",
+                            port,
+                            process_request=self.process_request)
+
+
+class NullOutputDevice:
+
+  async def send_async(self, chunk: bytes):
+    pass
+
+
+def create_transcriber_config(warmup: bool) -> DeepgramTranscriberConfig:
+  return DeepgramTranscriberConfig(
+    sampling_rate=DEFAULT_SAMPLING_RATE,
+    audio_encoding=DEFAULT_AUDIO_ENCODING,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    should_warmup_model=warmup,
+  )
+
+
+async def measure_greeting(transcriber: DeepgramTranscriber) -> float:
+  stubs = create_stubs(create_call_config())
+  stubs["transcriber"] = transcriber
+  conversation = StreamingConversation(NullOutputDevice(), **stubs)
+  await conversation.start()
+  greeting = conversation.trace.turns[0]
+  while FIRST_AUDIO_SENT not in greeting:
+    await asyncio.sleep(0.005)
+  conversation.terminate()
+  return greeting[FIRST_AUDIO_SENT] - greeting[CALL_ANSWERED]
+
+
+async def run_case(name: str, calls: int, warmup: bool,
+                   pool: Optional[TranscriberPool]) -> list[float]:
+  latencies = []
+  for _ in range(calls):
+    transcriber = DeepgramTranscriber(create_transcriber_config(warmup))
+    if pool:
+      transcriber.session = pool.lease(transcriber)
+    latencies.append(await measure_greeting(transcriber))
+    # gaps between calls, which is what the pool refills in
+    await asyncio.sleep(0.5)
+  print(f"{name:28} median {1000 * statistics.median(latencies):6.0f}ms  "
+        f"max {1000 * max(latencies):6.0f}ms")
+  return latencies
+
+
+async def main_async(args):
+  server = StubDeepgramServer(args.handshake_ms, args.idle_timeout)
+  async with server.serve(STUB_PORT):
+    print(f"{args.calls} calls, {args.handshake_ms} ms handshake")
+    await run_case("per call, with warmup", args.calls, True, None)
+    await run_case("per call, no warmup", args.calls, False, None)
+
+    pool = TranscriberPool(size=2)
+    pool.prewarm(create_transcriber_config(True))
+    # the server warms the pool at startup, before the first call
+    await asyncio.sleep(args.handshake_ms / 1000 + 6)
+    await run_case("pooled, with warmup", args.calls, True, pool)
+
+    # idle sessions must outlive the server's idle timeout
+    idle_closes = server.idle_closes
+    await asyncio.sleep(args.idle_timeout * 1.5)
+    print(f"pool after {1.5 * args.idle_timeout:.0f}s idle: {pool.stats()}, "
+          f"streams the server closed as idle: "
+          f"{server.idle_closes - idle_closes}")
+    await pool.close()
+
+
+def main(argv: Optional[list[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--calls", type=int, default=5)
+  parser.add_argument("--handshake-ms", type=int, default=400)
+  parser.add_argument("--idle-timeout", type=float, default=10)
+  args = parser.parse_args(argv)
+  asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,252 @@
+import json
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterable, Callable, Optional
+
+import aiohttp
+from langchain.schema import ChatMessage
+from vocode import getenv
+from vocode.streaming.agent import chat_gpt_agent
+from vocode.streaming.agent.utils import SENTENCE_ENDINGS
+from vocode.streaming.models.agent import ChatGPTAgentConfig
+
+from call_server.speculation import SpeculativeResponse
+
+OPENAI_API_BASE = getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+HTTP_POOL_SIZE = 100
+HTTP_KEEPALIVE_SECONDS = 60
+
+CLAUSE_ENDINGS = [",", ";", ":", "—"]
+# flush at a clause ending once this many words are buffered; 0 disables
+LLM_CLAUSE_FLUSH_MIN_WORDS = int(getenv("LLM_CLAUSE_FLUSH_MIN_WORDS", 4))
+# flush at the next word boundary after this many tokens; 0 disables
+LLM_MAX_TOKENS_PER_CHUNK = int(getenv("LLM_MAX_TOKENS_PER_CHUNK", 0))
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+  """One keep-alive connection pool shared by every call's agent.
+
+  Must be called from the server's event loop, which the session binds to.
+  """
+  global _http_session
+  if _http_session is None or _http_session.closed:
+    _http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+      limit=HTTP_POOL_SIZE,
+      keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+    ))
+  return _http_session
+
+
+async def close_http_session():
+  global _http_session
+  if _http_session is not None:
+    await _http_session.close()
+    _http_session = None
+
+
+async def stream_sse_events(
+    response: aiohttp.ClientResponse) -> AsyncGenerator[str, None]:
+  """Yields the data field of each server-sent event until [DONE]."""
+  data_lines = []
+  async for line in response.content:
+    line = line.decode("utf-8").rstrip("\r\n")
+    if line.startswith("data:"):
+      data_lines.append(line[5:].lstrip())
+    elif not line and data_lines:
+      data = "\n".join(data_lines)
+      data_lines = []
+      if data == "[DONE]":
+        return
+      yield data
+  if data_lines and data_lines != ["[DONE]"]:
+    yield "\n".join(data_lines)
+
+
+async def stream_llm_response_async(
+  gen: AsyncIterable[dict],
+  get_text: Callable[[dict], Optional[str]] = lambda choice: choice.get("text"),
+  sentence_endings: list[str] = SENTENCE_ENDINGS,
+  clause_endings: list[str] = CLAUSE_ENDINGS,
+  clause_flush_min_words: int = LLM_CLAUSE_FLUSH_MIN_WORDS,
+  max_tokens_per_chunk: int = LLM_MAX_TOKENS_PER_CHUNK,
+) -> AsyncGenerator[str, None]:
+  """Async vocode stream_llm_response that can also flush mid-sentence.
+
+  Besides sentence endings, a chunk is handed to synthesis at a clause ending
+  once it holds clause_flush_min_words words, or at the next word boundary
+  once it holds max_tokens_per_chunk tokens, so speech can start before a
+  long first sentence is finished. A clause ending only counts once the next
+  token starts with whitespace, so "1,200" and "9:30" stay in one piece.
+  """
+  buffer = ""
+  num_tokens = 0
+  at_clause_ending = False
+  async for response in gen:
+    choices = response.get("choices", [])
+    if len(choices) == 0:
+      break
+    choice = choices[0]
+    if choice["finish_reason"]:
+      break
+    token = get_text(choice)
+    if not token:
+      continue
+    if token[0].isspace() and buffer.strip() and (
+        at_clause_ending or
+      (max_tokens_per_chunk and num_tokens >= max_tokens_per_chunk)):
+      yield buffer.strip()
+      buffer = ""
+      num_tokens = 0
+    buffer += token
+    num_tokens += 1
+    at_clause_ending = False
+    if any(token.endswith(ending) for ending in sentence_endings):
+      yield buffer.strip()
+      buffer = ""
+      num_tokens = 0
+    elif (clause_flush_min_words
+          and any(token.endswith(ending) for ending in clause_endings)
+          and len(buffer.split()) >= clause_flush_min_words):
+      at_clause_ending = True
+  if buffer.strip():
+    yield buffer
+
+
+class ChatGPTAgent(chat_gpt_agent.ChatGPTAgent):
+  """vocode's ChatGPTAgent with an async streaming path for generate_response.
+
+  generate_response_async streams the completion over the shared aiohttp
+  pool, so token reads never block the event loop and each turn reuses a warm
+  connection. Time to first token is recorded per turn. speculate starts the
+  same stream for an interim transcript without touching memory.
+  """
+
+  def __init__(
+    self,
+    agent_config: ChatGPTAgentConfig,
+    logger: Optional[logging.Logger] = None,
+    openai_api_key: Optional[str] = None,
+    api_base: str = OPENAI_API_BASE,
+    clause_flush_min_words: int = LLM_CLAUSE_FLUSH_MIN_WORDS,
+    max_tokens_per_chunk: int = LLM_MAX_TOKENS_PER_CHUNK,
+  ):
+    super().__init__(agent_config,
+                     logger=logger,
+                     openai_api_key=openai_api_key)
+    self.api_key = openai_api_key or getenv("OPENAI_API_KEY")
+    self.api_base = api_base
+    self.clause_flush_min_words = clause_flush_min_words
+    self.max_tokens_per_chunk = max_tokens_per_chunk
+    self.time_to_first_token: Optional[float] = None
+    self.first_token_time: Optional[float] = None
+    self.times_to_first_token: list[float] = []
+
+  def get_chat_completion_payload(
+      self, pending_messages: Optional[list[ChatMessage]] = None) -> dict:
+    """pending_messages are sent after memory without being added to it."""
+    prompt_messages = [
+      ChatMessage(role="system", content=self.agent_config.prompt_preamble)
+    ] + self.memory.chat_memory.messages + (pending_messages or [])
+    return {
+      "model": self.agent_config.model_name,
+      "messages": [
+        prompt_message.dict(include={
+          "content": True,
+          "role": True
+        }) for prompt_message in prompt_messages
+      ],
+      "max_tokens": self.agent_config.max_tokens,
+      "temperature": self.agent_config.temperature,
+      "stream": True,
+    }
+
+  async def stream_chat_completion(self,
+                                   payload: dict) -> AsyncGenerator[dict, None]:
+    start_time = time.time()
+    async with get_http_session().post(
+        f"{self.api_base}/chat/completions",
+        headers={"Authorization": f"Bearer {self.api_key}"},
+        json=payload,
+    ) as response:
+      response.raise_for_status()
+      async for data in stream_sse_events(response):
+        event = json.loads(data)
+        if self.time_to_first_token is None:
+          choices = event.get("choices") or [{}]
+          if choices[0].get("delta", {}).get("content"):
+            self.first_token_time = time.time()
+            self.time_to_first_token = self.first_token_time - start_time
+            self.times_to_first_token.append(self.time_to_first_token)
+            self.logger.debug(
+              f"LLM time to first token: {self.time_to_first_token:.3f}s")
+        yield event
+
+  async def generate_response_async(
+      self,
+      human_input,
+      is_interrupt: bool = False) -> AsyncGenerator[str, None]:
+    self.time_to_first_token = None
+    self.first_token_time = None
+    self.memory.chat_memory.messages.append(
+      ChatMessage(role="user", content=human_input))
+    if is_interrupt and self.agent_config.cut_off_response:
+      cut_off_response = self.get_cut_off_response()
+      self.memory.chat_memory.messages.append(
+        ChatMessage(role="assistant", content=cut_off_response))
+      yield cut_off_response
+      return
+    payload = self.get_chat_completion_payload()
+    bot_memory_message = ChatMessage(role="assistant", content="")
+    self.memory.chat_memory.messages.append(bot_memory_message)
+    async with aclosing(self.stream_messages(payload,
+                                             bot_memory_message)) as messages:
+      async for message in messages:
+        yield message
+
+  async def stream_messages(
+      self, payload: dict,
+      bot_memory_message: ChatMessage) -> AsyncGenerator[str, None]:
+    # closing the events explicitly drops the connection as soon as the
+    # caller stops reading, e.g. when the bot is cut off, which stops the
+    # generation; aiohttp only reuses connections whose body was read in full
+    async with aclosing(self.stream_chat_completion(payload)) as events:
+      async for message in stream_llm_response_async(
+          events,
+          get_text=lambda choice: choice.get("delta", {}).get("content"),
+          clause_flush_min_words=self.clause_flush_min_words,
+          max_tokens_per_chunk=self.max_tokens_per_chunk,
+      ):
+        bot_memory_message.content = f"{bot_memory_message.content} {message}"
+        yield message
+
+  def get_memory_state(self) -> tuple[int, Optional[str]]:
+    messages = self.memory.chat_memory.messages
+    return len(messages), messages[-1].content if messages else None
+
+  def speculate(self, human_input: str) -> SpeculativeResponse:
+    """Starts generating a response to a transcript that may not be final.
+
+    Nothing is written to memory until the speculation is committed, and the
+    commit is refused if memory changed in the meantime, e.g. because the
+    previous response was cut off, since the prompt would then be stale.
+    """
+    self.time_to_first_token = None
+    self.first_token_time = None
+    user_message = ChatMessage(role="user", content=human_input)
+    bot_memory_message = ChatMessage(role="assistant", content="")
+    payload = self.get_chat_completion_payload([user_message])
+    memory_state = self.get_memory_state()
+
+    def on_commit() -> bool:
+      if self.get_memory_state() != memory_state:
+        return False
+      self.memory.chat_memory.messages.extend(
+        [user_message, bot_memory_message])
+      return True
+
+    return SpeculativeResponse(
+      human_input, self.stream_messages(payload, bot_memory_message),
+      on_commit)
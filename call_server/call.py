@@ -0,0 +1,148 @@
+import json
+import logging
+from typing import Optional
+
+from fastapi import WebSocket
+from vocode import getenv
+from vocode.streaming.agent.base_agent import BaseAgent
+from vocode.streaming.models.telephony import CallConfig, TwilioConfig
+from vocode.streaming.synthesizer.base_synthesizer import BaseSynthesizer
+from vocode.streaming.telephony.config_manager.base_config_manager import (
+  BaseConfigManager, )
+from vocode.streaming.telephony.conversation import call
+from vocode.streaming.telephony.conversation.call import PhoneCallAction
+from vocode.streaming.telephony.twilio import create_twilio_client
+from vocode.streaming.transcriber.base_transcriber import BaseTranscriber
+
+from call_server.factory import (
+  create_agent,
+  create_synthesizer,
+  create_transcriber,
+)
+from call_server.goodbye_model import BaseGoodbyeModel
+from call_server.media_codec import (
+  FRAME_MS,
+  InboundAudioBuffer,
+  parse_media_frame,
+)
+from call_server.metrics import CALL_ANSWERED
+from call_server.output_device import TwilioOutputDevice
+from call_server.streaming_conversation import StreamingConversation
+
+# batch this many ms of caller audio per transcriber send; 0 sends every frame
+INBOUND_COALESCE_MS = int(getenv("INBOUND_COALESCE_MS", 0))
+
+
+class Call(call.Call, StreamingConversation):
+  """A Twilio media stream driven by our StreamingConversation.
+
+  Takes ready-made transcriber/agent/synthesizer instances so callers can
+  swap in their own; from_call_config builds them from a CallConfig.
+  """
+
+  def __init__(
+    self,
+    base_url: str,
+    config_manager: BaseConfigManager,
+    transcriber: BaseTranscriber,
+    agent: BaseAgent,
+    synthesizer: BaseSynthesizer,
+    twilio_config: Optional[TwilioConfig] = None,
+    twilio_sid: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+    logger: Optional[logging.Logger] = None,
+    coalesce_inbound_ms: int = INBOUND_COALESCE_MS,
+    goodbye_model: Optional[BaseGoodbyeModel] = None,
+  ):
+    self.base_url = base_url
+    self.config_manager = config_manager
+    self.output_device = TwilioOutputDevice()
+    self.twilio_config = twilio_config or TwilioConfig(
+      account_sid=getenv("TWILIO_ACCOUNT_SID"),
+      auth_token=getenv("TWILIO_AUTH_TOKEN"),
+    )
+    self.twilio_client = create_twilio_client(self.twilio_config)
+    StreamingConversation.__init__(
+      self,
+      self.output_device,
+      transcriber,
+      agent,
+      synthesizer,
+      conversation_id=conversation_id,
+      per_chunk_allowance_seconds=0.01,
+      logger=logger,
+      goodbye_model=goodbye_model,
+    )
+    self.twilio_sid = twilio_sid
+    self.inbound_audio = InboundAudioBuffer(coalesce_ms=coalesce_inbound_ms)
+    set_input_chunk_ms = getattr(transcriber, "set_input_chunk_ms", None)
+    if set_input_chunk_ms:
+      set_input_chunk_ms(max(coalesce_inbound_ms, FRAME_MS))
+
+  @staticmethod
+  def from_call_config(
+    base_url: str,
+    call_config: CallConfig,
+    config_manager: BaseConfigManager,
+    conversation_id: str,
+    logger: logging.Logger,
+  ):
+    return Call(
+      base_url=base_url,
+      logger=logger,
+      config_manager=config_manager,
+      transcriber=create_transcriber(call_config.transcriber_config),
+      agent=create_agent(call_config.agent_config),
+      synthesizer=create_synthesizer(call_config.synthesizer_config),
+      twilio_config=call_config.twilio_config,
+      twilio_sid=call_config.twilio_sid,
+      conversation_id=conversation_id,
+    )
+
+  def hang_up_if_answered_by_machine(self) -> bool:
+    twilio_call = self.twilio_client.calls(self.twilio_sid).fetch()
+    if twilio_call.answered_by in ("machine_start", "fax"):
+      self.logger.info(f"Call answered by {twilio_call.answered_by}")
+      twilio_call.update(status="completed")
+      return True
+    return False
+
+  async def attach_ws_and_start(self, ws: WebSocket):
+    self.logger.debug("Trying to attach WS to outbound call")
+    self.output_device.ws = ws
+    self.logger.debug("Attached WS to outbound call")
+    self.trace.mark(CALL_ANSWERED)
+    try:
+      if await self.scheduler.run_blocking(self.hang_up_if_answered_by_machine):
+        return
+      await self.wait_for_twilio_start(ws)
+      await StreamingConversation.start(self)
+      while self.active:
+        message = await ws.receive_text()
+        response = await self.handle_ws_message(message)
+        if response == PhoneCallAction.CLOSE_WEBSOCKET:
+          break
+    finally:
+      self.tear_down()
+
+  async def handle_ws_message(self, message) -> PhoneCallAction:
+    if message is None:
+      return PhoneCallAction.CLOSE_WEBSOCKET
+
+    frame = parse_media_frame(message)
+    if frame:
+      for chunk in self.inbound_audio.add(frame):
+        self.receive_audio(chunk)
+      return
+    data = json.loads(message)
+    if data["event"] == "stop":
+      self.logger.debug(f"Media WS: Received event 'stop': {message}")
+      self.logger.debug("Stopping...")
+      return PhoneCallAction.CLOSE_WEBSOCKET
+
+  def mark_terminated(self):
+    if self.active:
+      # the Twilio REST call blocks, and must survive the conversation's tasks
+      self.scheduler.submit(self.end_twilio_call)
+    StreamingConversation.mark_terminated(self)
+    self.config_manager.delete_config(self.id)
@@ -0,0 +1,49 @@
+from vocode.streaming import factory
+from vocode.streaming.agent.base_agent import BaseAgent
+from vocode.streaming.models.agent import AgentConfig, AgentType
+from vocode.streaming.models.synthesizer import (
+  SynthesizerConfig,
+  SynthesizerType,
+)
+from vocode.streaming.models.transcriber import (
+  TranscriberConfig,
+  TranscriberType,
+)
+from vocode.streaming.synthesizer.base_synthesizer import BaseSynthesizer
+from vocode.streaming.transcriber.base_transcriber import BaseTranscriber
+
+from call_server.agent import ChatGPTAgent
+from call_server.synthesizer import (
+  AzureSynthesizer,
+  ElevenLabsSynthesizer,
+  GoogleSynthesizer,
+)
+from call_server.transcriber import DeepgramTranscriber
+from call_server.transcriber_pool import get_transcriber_pool
+
+__all__ = ["create_agent", "create_synthesizer", "create_transcriber"]
+
+
+def create_agent(agent_config: AgentConfig) -> BaseAgent:
+  if agent_config.type == AgentType.CHAT_GPT:
+    return ChatGPTAgent(agent_config=agent_config)
+  return factory.create_agent(agent_config)
+
+
+def create_transcriber(transcriber_config: TranscriberConfig) -> BaseTranscriber:
+  if transcriber_config.type == TranscriberType.DEEPGRAM:
+    transcriber = DeepgramTranscriber(transcriber_config)
+    transcriber.session = get_transcriber_pool().lease(transcriber)
+    return transcriber
+  return factory.create_transcriber(transcriber_config)
+
+
+def create_synthesizer(synthesizer_config: SynthesizerConfig) -> BaseSynthesizer:
+  if synthesizer_config.type == SynthesizerType.GOOGLE:
+    return GoogleSynthesizer(synthesizer_config)
+  elif synthesizer_config.type == SynthesizerType.AZURE:
+    return AzureSynthesizer(synthesizer_config)
+  elif synthesizer_config.type == SynthesizerType.ELEVEN_LABS:
+    return ElevenLabsSynthesizer(synthesizer_config)
+  else:
+    raise Exception("Invalid synthesizer config")
@@ -0,0 +1,83 @@
+import re
+from typing import Optional
+
+from vocode.streaming.utils.goodbye_model import GOODBYE_PHRASES
+
+# vocode's phrases plus common closings it misses
+DEFAULT_GOODBYE_PHRASES = GOODBYE_PHRASES + [
+  "have a nice day",
+  "have a great day",
+  "have a good one",
+  "good night",
+  "take care",
+  "talk soon",
+  "catch you later",
+  "i have to go",
+  "i need to go",
+  "i've got to go",
+  "i gotta go",
+]
+# words that may come before or after a goodbye phrase without changing
+# what the caller means, as in "okay thank you so much, talk to you later"
+CLOSING_WORDS = frozenset([
+  "ok", "okay", "alright", "all", "right", "well", "so", "oh", "yeah", "yes",
+  "great", "cool", "perfect", "awesome", "anyway", "and", "then", "now",
+  "too", "again", "thanks", "thank", "you", "very", "much", "really", "i",
+  "appreciate", "it", "for", "everything", "bye", "goodbye"
+])
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def get_words(text: str) -> list[str]:
+  return _WORD_PATTERN.findall(text.lower())
+
+
+class BaseGoodbyeModel:
+  """Decides whether a final transcript ends the conversation."""
+
+  async def is_goodbye(self, text: str) -> bool:
+    raise NotImplementedError
+
+
+class PhraseGoodbyeModel(BaseGoodbyeModel):
+  """Matches a goodbye phrase that makes up the whole utterance.
+
+  Only closing_words may surround the phrase, so "have a good day" ends the
+  call while "did you have a good day" and "talk to you later about the
+  refund" don't. A false positive hangs up on the caller, so anything the
+  phrases don't cover is left to the agent. Cheap enough to run inline on
+  the event loop, with no network access.
+  """
+
+  def __init__(
+    self,
+    phrases: list[str] = DEFAULT_GOODBYE_PHRASES,
+    closing_words: frozenset[str] = CLOSING_WORDS,
+  ):
+    self.phrases = [get_words(phrase) for phrase in phrases]
+    self.closing_words = closing_words
+
+  def is_covered_by(self, words: list[str], phrase: list[str]) -> bool:
+    for start in range(len(words) - len(phrase) + 1):
+      end = start + len(phrase)
+      if words[start:end] == phrase and all(
+          word in self.closing_words for word in words[:start] + words[end:]):
+        return True
+    return False
+
+  async def is_goodbye(self, text: str) -> bool:
+    words = get_words(text)
+    if "bye" in words or "goodbye" in words:
+      return True
+    return any(self.is_covered_by(words, phrase) for phrase in self.phrases)
+
+
+_goodbye_model: Optional[BaseGoodbyeModel] = None
+
+
+def get_goodbye_model() -> BaseGoodbyeModel:
+  global _goodbye_model
+  if _goodbye_model is None:
+    _goodbye_model = PhraseGoodbyeModel()
+  return _goodbye_model
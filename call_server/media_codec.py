@@ -0,0 +1,187 @@
+"""Codec helpers for the Twilio media stream path.
+
+Twilio sends and expects 8 kHz mu-law audio as base64 inside small JSON
+messages, one per 20 ms frame, so everything here is built to be cheap to
+call fifty times a second per call.
+"""
+import binascii
+import json
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+MULAW_SILENCE = b"\xff"
+MULAW_BYTES_PER_MS = 8
+FRAME_MS = 20
+
+_MEDIA_PREFIX = '{"event":"media"'
+_TIMESTAMP_KEY = '"timestamp":"'
+_PAYLOAD_KEY = '"payload":"'
+
+
+@lru_cache(maxsize=64)
+def get_silence(num_bytes: int) -> bytes:
+  """Shared, immutable mu-law silence buffers; gap sizes repeat constantly."""
+  return MULAW_SILENCE * num_bytes
+
+
+class Resampler:
+  """Streaming PCM16 resampler that carries its filter state between chunks.
+
+  Downsampling runs a windowed-sinc low-pass first; both the filter history
+  and the fractional read position survive across calls, so chunk
+  boundaries don't click the way independent audioop.ratecv calls do.
+  """
+
+  def __init__(self, input_rate: int, output_rate: int, num_taps: int = 31):
+    self.input_rate = input_rate
+    self.output_rate = output_rate
+    self.step = input_rate / output_rate
+    # integer ratios (24k/16k/48k -> 8k) just keep every nth filtered sample
+    self.decimation = (input_rate // output_rate
+                       if input_rate % output_rate == 0 else None)
+    self.taps: Optional[np.ndarray] = None
+    if output_rate < input_rate:
+      cutoff = 0.5 * output_rate / input_rate
+      n = np.arange(num_taps) - (num_taps - 1) / 2
+      taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(num_taps)
+      self.taps = (taps / taps.sum()).astype(np.float32)
+      self.reversed_taps = self.taps[::-1].copy()
+    self.history = np.zeros(num_taps - 1 if self.taps is not None else 0,
+                            dtype=np.float32)
+    # the last sample of the previous chunk, for interpolation
+    self.previous_sample = np.zeros(1, dtype=np.float32)
+    self.position = 0.0
+    self.phase = 0
+
+  def process(self, chunk: bytes) -> bytes:
+    if self.input_rate == self.output_rate:
+      return chunk
+    samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+    if self.taps is None:
+      resampled = self.interpolate(samples)
+    else:
+      padded = np.concatenate((self.history, samples))
+      self.history = padded[len(samples):]
+      step = self.decimation or 1
+      # one row per output sample, viewing the input without copying it
+      num_outputs = (len(samples) - 1 - self.phase) // step + 1
+      windows = as_strided(
+        padded[self.phase:],
+        shape=(max(num_outputs, 0), len(self.taps)),
+        strides=(padded.strides[0] * step, padded.strides[0]),
+        writeable=False,
+      )
+      resampled = windows @ self.reversed_taps
+      if self.decimation:
+        self.phase = (self.phase - len(samples)) % self.decimation
+      else:
+        resampled = self.interpolate(resampled)
+    resampled = np.maximum(np.minimum(np.rint(resampled), 32767), -32768)
+    return resampled.astype(np.int16).tobytes()
+
+  def interpolate(self, samples: np.ndarray) -> np.ndarray:
+    # index 0 is the carried sample, so positions are relative to it
+    samples = np.concatenate((self.previous_sample, samples))
+    self.previous_sample = samples[-1:]
+    positions = np.arange(self.position, len(samples) - 1, self.step)
+    if len(positions) == 0:
+      self.position -= len(samples) - 1
+      return positions
+    self.position = positions[-1] + self.step - (len(samples) - 1)
+    return np.interp(positions, np.arange(len(samples)), samples)
+
+
+class MediaFrame:
+
+  def __init__(self, timestamp: int, payload: bytes):
+    self.timestamp = timestamp
+    self.payload = payload
+
+
+def parse_media_frame(message: str) -> Optional[MediaFrame]:
+  """Pulls timestamp and audio out of a Twilio media message.
+
+  Returns None for any other event. Twilio's compact media messages are
+  recognised by prefix and scanned with str.find; everything else (the rare
+  start/mark/stop events, or unexpected formatting) goes through json.loads.
+  """
+  if not message.startswith(_MEDIA_PREFIX):
+    return _parse_media_frame_json(message)
+  timestamp_start = message.find(_TIMESTAMP_KEY)
+  payload_start = message.find(_PAYLOAD_KEY)
+  if timestamp_start < 0 or payload_start < 0:
+    return _parse_media_frame_json(message)
+  timestamp_start += len(_TIMESTAMP_KEY)
+  payload_start += len(_PAYLOAD_KEY)
+  timestamp_end = message.find('"', timestamp_start)
+  payload_end = message.find('"', payload_start)
+  try:
+    return MediaFrame(
+      int(message[timestamp_start:timestamp_end]),
+      binascii.a2b_base64(message[payload_start:payload_end]),
+    )
+  except (ValueError, binascii.Error):
+    return _parse_media_frame_json(message)
+
+
+def _parse_media_frame_json(message: str) -> Optional[MediaFrame]:
+  data = json.loads(message)
+  if data.get("event") != "media":
+    return None
+  media = data["media"]
+  return MediaFrame(int(media["timestamp"]),
+                    binascii.a2b_base64(media["payload"]))
+
+
+class MediaFrameEncoder:
+  """Builds outbound media messages around a precomputed JSON prefix."""
+
+  def __init__(self, stream_sid: str):
+    self.stream_sid = stream_sid
+    self.prefix = ('{"event":"media","streamSid":%s,"media":{"payload":"' %
+                   json.dumps(stream_sid))
+    self.suffix = '"}}'
+
+  def encode(self, chunk: bytes) -> str:
+    return self.prefix + binascii.b2a_base64(
+      chunk, newline=False).decode("ascii") + self.suffix
+
+
+class InboundAudioBuffer:
+  """Fills timestamp gaps with silence and optionally coalesces frames.
+
+  With coalesce_ms set, audio is handed on in blocks of at least that many
+  milliseconds, so the transcriber sends a few larger websocket messages
+  instead of one per 20 ms frame.
+  """
+
+  def __init__(self, coalesce_ms: int = 0):
+    self.coalesce_bytes = coalesce_ms * MULAW_BYTES_PER_MS
+    self.buffer = bytearray()
+    self.latest_timestamp = 0
+
+  def add(self, frame: MediaFrame) -> list[bytes]:
+    """Returns the chunks that are ready to be sent on."""
+    chunks = []
+    expected_timestamp = self.latest_timestamp + FRAME_MS
+    if expected_timestamp < frame.timestamp:
+      chunks.append(
+        get_silence(MULAW_BYTES_PER_MS *
+                    (frame.timestamp - expected_timestamp)))
+    self.latest_timestamp = frame.timestamp
+    chunks.append(frame.payload)
+    if not self.coalesce_bytes:
+      return chunks
+    for chunk in chunks:
+      self.buffer += chunk
+    if len(self.buffer) < self.coalesce_bytes:
+      return []
+    return [self.flush()]
+
+  def flush(self) -> bytes:
+    chunk = bytes(self.buffer)
+    self.buffer.clear()
+    return chunk
@@ -0,0 +1,208 @@
+import bisect
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from vocode import getenv
+
+from call_server.synthesis_cache import get_synthesis_cache
+
+# where to write one JSON trace per call; unset disables the dump
+CALL_TRACE_DIR = getenv("CALL_TRACE_DIR")
+
+CALL_ANSWERED = "call_answered"
+END_OF_SPEECH = "end_of_speech"
+FINAL_TRANSCRIPT = "final_transcript"
+FIRST_LLM_TOKEN = "first_llm_token"
+FIRST_TTS_BYTE = "first_tts_byte"
+FIRST_AUDIO_SENT = "first_audio_sent"
+
+INTERRUPTIONS = "interruptions"
+FILLER_AUDIO = "filler_audio"
+IDLE_TIMEOUTS = "idle_timeouts"
+SPECULATIONS = "speculations"
+SPECULATION_HITS = "speculation_hits"
+# endpointing time the agent spent generating a committed speculation
+SPECULATION_SAVED_SECONDS = "speculation_saved_seconds"
+COUNTERS = [
+  INTERRUPTIONS,
+  FILLER_AUDIO,
+  IDLE_TIMEOUTS,
+  SPECULATIONS,
+  SPECULATION_HITS,
+  SPECULATION_SAVED_SECONDS,
+]
+
+# (histogram, from event, to event), observed as soon as both are marked
+STAGES = [
+  ("greeting_latency_seconds", CALL_ANSWERED, FIRST_AUDIO_SENT),
+  ("endpointing_latency_seconds", END_OF_SPEECH, FINAL_TRANSCRIPT),
+  ("llm_first_token_latency_seconds", FINAL_TRANSCRIPT, FIRST_LLM_TOKEN),
+  ("tts_first_byte_latency_seconds", FIRST_LLM_TOKEN, FIRST_TTS_BYTE),
+  ("output_first_frame_latency_seconds", FIRST_TTS_BYTE, FIRST_AUDIO_SENT),
+  ("response_latency_seconds", END_OF_SPEECH, FIRST_AUDIO_SENT),
+]
+_STAGES_BY_EVENT: dict[str, list[tuple[str, str, str]]] = {}
+for _stage in STAGES:
+  for _event in _stage[1:]:
+    _STAGES_BY_EVENT.setdefault(_event, []).append(_stage)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+
+class Histogram:
+
+  def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+    self.buckets = buckets
+    # the last slot counts observations above every bucket (+Inf)
+    self.counts = [0] * (len(buckets) + 1)
+    self.sum = 0.0
+    self.count = 0
+
+  def observe(self, value: float):
+    self.counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+
+
+class Metrics:
+  """Process-wide aggregates of every call's trace, rendered for /metrics.
+
+  Only touched from the server's event loop, so nothing here is locked.
+  """
+
+  def __init__(self):
+    self.histograms = {name: Histogram() for name, _, _ in STAGES}
+    self.counters = {
+      "calls_total": 0,
+      "turns_total": 0,
+      **{f"{counter}_total": 0 for counter in COUNTERS},
+    }
+    self.active_calls = 0
+
+  def get_synthesis_cache_counters(self) -> dict[str, int]:
+    # hits count both tiers; disk hits are the ones that missed memory
+    stats = get_synthesis_cache().stats()
+    return {
+      "synthesis_cache_hits_total": stats["memory_hits"] + stats["disk_hits"],
+      "synthesis_cache_disk_hits_total": stats["disk_hits"],
+      "synthesis_cache_misses_total": stats["misses"],
+    }
+
+  def render(self, prefix: str = "call_server") -> str:
+    """Prometheus text exposition format."""
+    lines = [f"# TYPE {prefix}_active_calls gauge",
+             f"{prefix}_active_calls {self.active_calls}"]
+    for name, value in {
+        **self.counters,
+        **self.get_synthesis_cache_counters()
+    }.items():
+      lines.append(f"# TYPE {prefix}_{name} counter")
+      lines.append(f"{prefix}_{name} {value}")
+    for name, histogram in self.histograms.items():
+      lines.append(f"# TYPE {prefix}_{name} histogram")
+      cumulative = 0
+      for bucket, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{prefix}_{name}_bucket{{le="{bucket}"}} {cumulative}')
+      lines.append(f'{prefix}_{name}_bucket{{le="+Inf"}} {histogram.count}')
+      lines.append(f"{prefix}_{name}_sum {histogram.sum:.6f}")
+      lines.append(f"{prefix}_{name}_count {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+  global _metrics
+  if _metrics is None:
+    _metrics = Metrics()
+  return _metrics
+
+
+class CallTrace:
+  """Timeline of one call, one dict of event -> wall time per turn.
+
+  Turn 0 is the greeting; every final transcript starts a new turn. Only the
+  first occurrence of an event in a turn is kept, and each stage in STAGES is
+  fed to the shared histograms the moment both of its ends are known.
+  """
+
+  def __init__(self,
+               conversation_id: str,
+               metrics: Optional[Metrics] = None,
+               trace_dir: Optional[str] = CALL_TRACE_DIR,
+               logger: Optional[logging.Logger] = None):
+    self.conversation_id = conversation_id
+    self.metrics = metrics or get_metrics()
+    self.trace_dir = trace_dir
+    self.logger = logger or logging.getLogger(__name__)
+    self.started_at = time.time()
+    self.turns: list[dict[str, float]] = [{}]
+    self.counters = {counter: 0 for counter in COUNTERS}
+    self.is_active = False
+
+  def start(self):
+    if self.is_active:
+      return
+    self.is_active = True
+    self.metrics.active_calls += 1
+    self.metrics.counters["calls_total"] += 1
+
+  def start_turn(self, end_of_speech: Optional[float] = None):
+    self.turns.append({})
+    self.metrics.counters["turns_total"] += 1
+    if end_of_speech:
+      self.mark(END_OF_SPEECH, end_of_speech)
+
+  @property
+  def current_turn(self) -> int:
+    return len(self.turns) - 1
+
+  def mark(self,
+           event: str,
+           timestamp: Optional[float] = None,
+           turn_index: Optional[int] = None):
+    """turn_index pins work that started in an earlier turn to that turn."""
+    turn = self.turns[self.current_turn if turn_index is None else turn_index]
+    if event in turn:
+      return
+    turn[event] = timestamp or time.time()
+    for name, start_event, end_event in _STAGES_BY_EVENT.get(event, []):
+      if start_event in turn and end_event in turn:
+        self.metrics.histograms[name].observe(
+          max(turn[end_event] - turn[start_event], 0))
+
+  def count(self, counter: str, amount: float = 1):
+    self.counters[counter] += amount
+    self.metrics.counters[f"{counter}_total"] += amount
+
+  def finish(self):
+    if self.is_active:
+      self.is_active = False
+      self.metrics.active_calls -= 1
+
+  def to_dict(self) -> dict:
+    return {
+      "conversation_id": self.conversation_id,
+      "started_at": self.started_at,
+      "counters": dict(self.counters),
+      # seconds since the call started
+      "turns": [{
+        event: round(timestamp - self.started_at, 4)
+        for event, timestamp in turn.items()
+      } for turn in self.turns],
+    }
+
+  def dump(self, trace: dict):
+    """Writes a to_dict snapshot; blocking, so run it on the scheduler."""
+    path = os.path.join(self.trace_dir, f"{self.conversation_id}.json")
+    try:
+      os.makedirs(self.trace_dir, exist_ok=True)
+      with open(path, "w") as f:
+        json.dump(trace, f)
+    except OSError as e:
+      self.logger.debug(f"Could not write call trace to {path}: {e}")
@@ -0,0 +1,19 @@
+from typing import Optional
+
+from fastapi import WebSocket
+from vocode.streaming.output_device import twilio_output_device
+
+from call_server.media_codec import MediaFrameEncoder
+
+
+class TwilioOutputDevice(twilio_output_device.TwilioOutputDevice):
+
+  def __init__(self, ws: WebSocket = None, stream_sid: str = None):
+    super().__init__(ws=ws, stream_sid=stream_sid)
+    self.encoder: Optional[MediaFrameEncoder] = None
+
+  async def send_async(self, chunk: bytes):
+    # stream_sid is only known once Twilio's start event has arrived
+    if self.encoder is None or self.encoder.stream_sid != self.stream_sid:
+      self.encoder = MediaFrameEncoder(self.stream_sid)
+    await self.ws.send_text(self.encoder.encode(chunk))
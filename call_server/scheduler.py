@@ -0,0 +1,53 @@
+import asyncio
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Callable, Iterable, Optional
+
+DEFAULT_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+_EXHAUSTED = object()
+
+
+class SynthesisScheduler:
+  """Runs the synthesis side of every active call in the process.
+
+  Conversations share the server's event loop; the blocking provider calls
+  they make (synthesis requests, reading audio streams, agent responses) go
+  through one bounded thread pool instead of a thread and loop per call.
+  """
+
+  def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+    self.executor = ThreadPoolExecutor(
+      max_workers=max_workers,
+      thread_name_prefix="synthesizer",
+    )
+
+  async def run_blocking(self, fn: Callable[..., Any], *args) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(self.executor, fn, *args)
+
+  async def iterate_blocking(self, iterable: Iterable) -> AsyncGenerator:
+    """Drains a blocking generator without stalling the event loop."""
+    iterator = iter(iterable)
+    while True:
+      item = await self.run_blocking(next, iterator, _EXHAUSTED)
+      if item is _EXHAUSTED:
+        return
+      yield item
+
+  def submit(self, fn: Callable[..., Any], *args) -> Future:
+    """Fire-and-forget for work that must outlive the conversation's tasks."""
+    return self.executor.submit(fn, *args)
+
+  def shutdown(self):
+    self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_scheduler: Optional[SynthesisScheduler] = None
+
+
+def get_scheduler() -> SynthesisScheduler:
+  global _scheduler
+  if _scheduler is None:
+    _scheduler = SynthesisScheduler()
+  return _scheduler
@@ -0,0 +1,185 @@
+import logging
+from typing import Optional
+
+import uvicorn
+from fastapi import APIRouter, FastAPI, Form, Response, WebSocket
+from vocode import getenv
+from vocode.streaming.models.agent import AgentConfig, FillerAudioConfig
+from vocode.streaming.models.message import BaseMessage
+from vocode.streaming.models.synthesizer import (
+  AzureSynthesizerConfig,
+  SynthesizerConfig,
+)
+from vocode.streaming.models.telephony import CallConfig, TwilioConfig
+from vocode.streaming.models.transcriber import (
+  DeepgramTranscriberConfig,
+  PunctuationEndpointingConfig,
+  TranscriberConfig,
+  TranscriberType,
+)
+from vocode.streaming.synthesizer.base_synthesizer import FILLER_PHRASES
+from vocode.streaming.telephony.config_manager.in_memory_config_manager import (
+  InMemoryConfigManager, )
+from vocode.streaming.telephony.constants import (
+  DEFAULT_AUDIO_ENCODING,
+  DEFAULT_CHUNK_SIZE,
+  DEFAULT_SAMPLING_RATE,
+)
+from vocode.streaming.telephony.templates import Templater
+from vocode.streaming.utils import create_conversation_id
+
+from call_server.agent import close_http_session
+from call_server.call import Call
+from call_server.factory import create_synthesizer
+from call_server.metrics import get_metrics
+from call_server.scheduler import get_scheduler
+from call_server.synthesis_cache import get_synthesis_cache
+from call_server.synthesizer import CachingSynthesizer
+from call_server.transcriber_pool import get_transcriber_pool
+
+
+class ConfigManager(InMemoryConfigManager):
+  # calls delete their config on every termination path, so this must be idempotent
+  def delete_config(self, conversation_id):
+    self.configs.pop(conversation_id, None)
+
+
+class CallsRouter:
+
+  def __init__(
+    self,
+    base_url: str,
+    config_manager: InMemoryConfigManager,
+    logger: Optional[logging.Logger] = None,
+  ):
+    self.base_url = base_url
+    self.config_manager = config_manager
+    self.logger = logger or logging.getLogger(__name__)
+    self.router = APIRouter()
+    self.router.websocket("/connect_call/{id}")(self.connect_call)
+
+  def create_call(self, id: str, call_config: CallConfig) -> Call:
+    return Call.from_call_config(self.base_url, call_config,
+                                 self.config_manager, id, self.logger)
+
+  async def connect_call(self, websocket: WebSocket, id: str):
+    await websocket.accept()
+    self.logger.debug("Phone WS connection opened for chat {}".format(id))
+    call_config = self.config_manager.get_config(id)
+    if not call_config:
+      self.logger.debug("No active phone call for chat {}".format(id))
+      await websocket.close()
+      return
+    call = self.create_call(id, call_config)
+    await call.attach_ws_and_start(websocket)
+    self.config_manager.delete_config(call.id)
+    self.logger.debug("Phone WS connection closed for chat {}".format(id))
+
+  def get_router(self) -> APIRouter:
+    return self.router
+
+
+class InboundCallServer:
+  """Answers Twilio calls and runs the conversations in this process.
+
+  Twilio POSTs to /vocode when a call comes in; we store the call's config and
+  answer with TwiML that connects the call's media stream to /connect_call.
+  """
+
+  def __init__(
+    self,
+    agent_config: AgentConfig,
+    base_url: str,
+    transcriber_config: Optional[TranscriberConfig] = None,
+    synthesizer_config: Optional[SynthesizerConfig] = None,
+    twilio_config: Optional[TwilioConfig] = None,
+    logger: Optional[logging.Logger] = None,
+  ):
+    self.agent_config = agent_config
+    self.base_url = base_url
+    self.transcriber_config = transcriber_config or DeepgramTranscriberConfig(
+      sampling_rate=DEFAULT_SAMPLING_RATE,
+      audio_encoding=DEFAULT_AUDIO_ENCODING,
+      chunk_size=DEFAULT_CHUNK_SIZE,
+      model="voicemail",
+      endpointing_config=PunctuationEndpointingConfig(),
+    )
+    self.synthesizer_config = synthesizer_config or AzureSynthesizerConfig(
+      sampling_rate=DEFAULT_SAMPLING_RATE,
+      audio_encoding=DEFAULT_AUDIO_ENCODING,
+    )
+    self.twilio_config = twilio_config or TwilioConfig(
+      account_sid=getenv("TWILIO_ACCOUNT_SID"),
+      auth_token=getenv("TWILIO_AUTH_TOKEN"),
+    )
+    self.logger = logger or logging.getLogger(__name__)
+    self.config_manager = ConfigManager()
+    self.templater = Templater()
+    self.calls_router = CallsRouter(
+      base_url=base_url,
+      config_manager=self.config_manager,
+      logger=self.logger,
+    )
+    self.app = FastAPI()
+    self.app.post("/vocode")(self.handle_call)
+    self.app.get("/metrics")(self.get_metrics)
+    self.app.include_router(self.calls_router.get_router())
+    self.app.on_event("startup")(self.prewarm_synthesis_cache)
+    self.app.on_event("startup")(self.prewarm_transcribers)
+    self.app.on_event("shutdown")(close_http_session)
+    self.app.on_event("shutdown")(get_transcriber_pool().close)
+
+  def handle_call(self, twilio_sid: str = Form(alias="CallSid")):
+    call_config = CallConfig(
+      transcriber_config=self.transcriber_config,
+      agent_config=self.agent_config,
+      synthesizer_config=self.synthesizer_config,
+      twilio_config=self.twilio_config,
+      twilio_sid=twilio_sid,
+    )
+    conversation_id = create_conversation_id()
+    self.config_manager.save_config(conversation_id, call_config)
+    return self.templater.get_connection_twiml(base_url=self.base_url,
+                                               call_id=conversation_id)
+
+  async def get_metrics(self):
+    return Response(content=get_metrics().render(),
+                    media_type="text/plain; version=0.0.4")
+
+  def get_prewarm_messages(self) -> list[BaseMessage]:
+    messages = []
+    if self.agent_config.initial_message:
+      messages.append(self.agent_config.initial_message)
+    send_filler_audio = self.agent_config.send_filler_audio
+    if send_filler_audio and (not isinstance(send_filler_audio,
+                                             FillerAudioConfig)
+                              or send_filler_audio.use_phrases):
+      messages.extend(FILLER_PHRASES)
+    return messages
+
+  def prewarm_synthesis_cache(self):
+    """Synthesizes the lines every call opens with before the first call."""
+    messages = self.get_prewarm_messages()
+    if messages:
+      get_scheduler().submit(self.synthesize_to_cache, messages)
+
+  def synthesize_to_cache(self, messages: list[BaseMessage]):
+    try:
+      synthesizer = create_synthesizer(self.synthesizer_config)
+      if not isinstance(synthesizer, CachingSynthesizer):
+        return
+      for message in messages:
+        synthesizer.synthesize_to_cache(message)
+    except Exception as e:
+      self.logger.warning(f"Could not prewarm synthesis cache: {e}")
+      return
+    self.logger.debug(
+      f"Prewarmed synthesis cache: {get_synthesis_cache().stats()}")
+
+  async def prewarm_transcribers(self):
+    """Opens Deepgram streams ahead of the first call; see TranscriberPool."""
+    if self.transcriber_config.type == TranscriberType.DEEPGRAM:
+      get_transcriber_pool().prewarm(self.transcriber_config)
+
+  def run(self, host="localhost", port=3000):
+    uvicorn.run(self.app, host=host, port=port)
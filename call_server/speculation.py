@@ -0,0 +1,95 @@
+import asyncio
+import re
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Callable, Optional
+
+from vocode import getenv
+
+# start generating once an interim transcript has been quiet this long;
+# 0 disables speculation
+SPECULATION_STABLE_MS = int(getenv("SPECULATION_STABLE_MS", 0))
+# also synthesize the first sentence of a speculative response up front
+SPECULATION_PRESYNTHESIZE = getenv("SPECULATION_PRESYNTHESIZE", "0") == "1"
+
+
+def normalize_transcript(text: str) -> str:
+  """Lowercase words only, so "Hi, there." matches "hi there"."""
+  return " ".join(re.findall(r"[\w']+", text.lower()))
+
+
+class SpeculativeResponse:
+  """An agent response generated before the caller's turn is final.
+
+  Messages are buffered in the background as the agent produces them. If the
+  final transcript matches, try_commit lets the agent record the turn in its
+  memory and responses replays the buffer and then the rest of the stream;
+  otherwise cancel drops everything and the agent's memory is never touched.
+  """
+
+  def __init__(
+    self,
+    human_input: str,
+    messages: AsyncIterator[str],
+    on_commit: Callable[[], bool],
+  ):
+    self.human_input = human_input
+    self.normalized_input = normalize_transcript(human_input)
+    self.on_commit = on_commit
+    self.started_at = time.time()
+    self.first_message_time: Optional[float] = None
+    self.first_message: asyncio.Future[Optional[str]] = (
+      asyncio.get_running_loop().create_future())
+    # None marks the end of the response
+    self.queue: asyncio.Queue[Optional[str]] = asyncio.Queue()
+    self.error: Optional[BaseException] = None
+    self.is_committed = False
+    self.task = asyncio.create_task(self.buffer(messages))
+
+  async def buffer(self, messages: AsyncIterator[str]):
+    try:
+      async with aclosing(messages):
+        async for message in messages:
+          if self.first_message_time is None:
+            self.first_message_time = time.time()
+            self.first_message.set_result(message)
+          self.queue.put_nowait(message)
+    except Exception as e:
+      self.error = e
+    finally:
+      if not self.first_message.done():
+        self.first_message.set_result(None)
+      self.queue.put_nowait(None)
+
+  def matches(self, transcript: str) -> bool:
+    return normalize_transcript(transcript) == self.normalized_input
+
+  def try_commit(self) -> bool:
+    """False when the agent's memory moved on since speculation started."""
+    if self.is_committed or self.task.cancelled() or not self.on_commit():
+      return False
+    self.is_committed = True
+    return True
+
+  def get_time_saved(self, final_time: float) -> float:
+    """How much of the agent's time to first message overlapped endpointing."""
+    end = final_time
+    if self.first_message_time is not None:
+      end = min(end, self.first_message_time)
+    return max(end - self.started_at, 0)
+
+  async def responses(self) -> AsyncGenerator[str, None]:
+    """The committed response; closing it stops the agent's stream."""
+    try:
+      while True:
+        message = await self.queue.get()
+        if message is None:
+          break
+        yield message
+      if self.error:
+        raise self.error
+    finally:
+      self.cancel()
+
+  def cancel(self):
+    self.task.cancel()
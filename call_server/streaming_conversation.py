@@ -0,0 +1,747 @@
+import asyncio
+import logging
+import random
+import time
+from collections.abc import AsyncIterable
+from contextlib import aclosing
+from typing import Coroutine, Optional
+
+from vocode import getenv
+from vocode.streaming import streaming_conversation
+from vocode.streaming.agent.base_agent import BaseAgent
+from vocode.streaming.agent.bot_sentiment_analyser import BotSentimentAnalyser
+from vocode.streaming.constants import (
+  ALLOWED_IDLE_TIME,
+  PER_CHUNK_ALLOWANCE_SECONDS,
+  TEXT_TO_SPEECH_CHUNK_SIZE_SECONDS,
+)
+from vocode.streaming.models.agent import (
+  FILLER_AUDIO_DEFAULT_SILENCE_THRESHOLD_SECONDS,
+  FillerAudioConfig,
+)
+from vocode.streaming.models.message import BaseMessage
+from vocode.streaming.models.synthesizer import TrackBotSentimentConfig
+from vocode.streaming.output_device.base_output_device import BaseOutputDevice
+from vocode.streaming.synthesizer.base_synthesizer import (
+  BaseSynthesizer,
+  FillerAudio,
+  SynthesisResult,
+)
+from vocode.streaming.transcriber.base_transcriber import (
+  BaseTranscriber,
+  Transcription,
+)
+from vocode.streaming.utils import (
+  create_conversation_id,
+  get_chunk_size_per_second,
+)
+
+from call_server.goodbye_model import BaseGoodbyeModel, get_goodbye_model
+from call_server.metrics import (
+  CALL_ANSWERED,
+  FILLER_AUDIO,
+  FINAL_TRANSCRIPT,
+  FIRST_AUDIO_SENT,
+  FIRST_LLM_TOKEN,
+  FIRST_TTS_BYTE,
+  IDLE_TIMEOUTS,
+  INTERRUPTIONS,
+  SPECULATION_HITS,
+  SPECULATION_SAVED_SECONDS,
+  SPECULATIONS,
+  CallTrace,
+)
+from call_server.scheduler import SynthesisScheduler, get_scheduler
+from call_server.speculation import (
+  SPECULATION_PRESYNTHESIZE,
+  SPECULATION_STABLE_MS,
+  SpeculativeResponse,
+)
+from call_server.transcript import Transcript
+
+# wait for the transcript to be quiet this long before analysing it
+BOT_SENTIMENT_DEBOUNCE_SECONDS = 1.0
+# only the most recent messages are sent to the sentiment model
+BOT_SENTIMENT_WINDOW_MESSAGES = 10
+# sentiment requests in flight across all calls
+MAX_BOT_SENTIMENT_REQUESTS = int(getenv("MAX_BOT_SENTIMENT_REQUESTS", 4))
+# messages synthesized ahead of the one playing; 0 synthesizes each message
+# only once the previous one has played
+SYNTHESIS_LOOKAHEAD = int(getenv("SYNTHESIS_LOOKAHEAD", 1))
+
+_bot_sentiment_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_bot_sentiment_semaphore() -> asyncio.Semaphore:
+  global _bot_sentiment_semaphore
+  if _bot_sentiment_semaphore is None:
+    _bot_sentiment_semaphore = asyncio.Semaphore(MAX_BOT_SENTIMENT_REQUESTS)
+  return _bot_sentiment_semaphore
+
+
+class StreamingConversation(streaming_conversation.StreamingConversation):
+  """vocode's StreamingConversation without a synthesizer thread per call.
+
+  All synthesis runs as tasks on the shared event loop, blocking provider
+  calls are handed to the process-wide SynthesisScheduler, and every stop /
+  done signal is an asyncio.Event so nothing has to spin-wait.
+
+  While one message of a response plays, up to synthesis_lookahead of the
+  next ones are already being synthesized; they are dropped if the bot is
+  cut off.
+
+  With speculation_stable_ms set, agents that support it start responding
+  once an interim transcript has been quiet that long; the response is kept
+  if the final transcript matches and dropped otherwise.
+  """
+
+  def __init__(
+    self,
+    output_device: BaseOutputDevice,
+    transcriber: BaseTranscriber,
+    agent: BaseAgent,
+    synthesizer: BaseSynthesizer,
+    conversation_id: str = None,
+    per_chunk_allowance_seconds: int = PER_CHUNK_ALLOWANCE_SECONDS,
+    logger: Optional[logging.Logger] = None,
+    scheduler: Optional[SynthesisScheduler] = None,
+    goodbye_model: Optional[BaseGoodbyeModel] = None,
+    speculation_stable_ms: int = SPECULATION_STABLE_MS,
+    presynthesize_speculation: bool = SPECULATION_PRESYNTHESIZE,
+    synthesis_lookahead: int = SYNTHESIS_LOOKAHEAD,
+  ):
+    self.id = conversation_id or create_conversation_id()
+    self.logger = logger or logging.getLogger(__name__)
+    self.output_device = output_device
+    self.transcriber = transcriber
+    self.transcriber.set_on_response(self.on_transcription_response)
+    self.transcriber_task = None
+    self.agent = agent
+    self.synthesizer = synthesizer
+    self.scheduler = scheduler or get_scheduler()
+    self.tasks: set[asyncio.Task] = set()
+    self.per_chunk_allowance_seconds = per_chunk_allowance_seconds
+    self.synthesis_lookahead = synthesis_lookahead
+    self.transcript = Transcript()
+    self.transcript_changed = asyncio.Event()
+    self.transcript.add_listener(self.transcript_changed.set)
+    self.trace = CallTrace(self.id, logger=self.logger)
+    self.bot_sentiment = None
+    track_bot_sentiment_in_voice = (
+      self.synthesizer.get_synthesizer_config().track_bot_sentiment_in_voice)
+    if track_bot_sentiment_in_voice:
+      if isinstance(track_bot_sentiment_in_voice, bool):
+        self.track_bot_sentiment_config = TrackBotSentimentConfig()
+      else:
+        self.track_bot_sentiment_config = track_bot_sentiment_in_voice
+      self.bot_sentiment_analyser = BotSentimentAnalyser(
+        emotions=self.track_bot_sentiment_config.emotions)
+    if self.agent.get_agent_config().end_conversation_on_goodbye:
+      self.goodbye_model = goodbye_model or get_goodbye_model()
+
+    self.is_human_speaking = False
+    self.active = False
+    self.is_current_synthesis_interruptable = False
+    self.stop_events: asyncio.Queue[asyncio.Event] = asyncio.Queue()
+    self.last_action_timestamp = time.time()
+    self.check_for_idle_task = None
+    self.track_bot_sentiment_task = None
+    self.should_wait_for_filler_audio_done_event = False
+    self.current_filler_audio_done_event: Optional[asyncio.Event] = None
+    self.current_filler_seconds_per_chunk: int = 0
+    self.current_transcription_is_interrupt: bool = False
+    self.speculation_stable_ms = speculation_stable_ms
+    self.presynthesize_speculation = presynthesize_speculation
+    self.speculation: Optional[SpeculativeResponse] = None
+    self.speculation_synthesis: Optional[asyncio.Task] = None
+    self.speculation_timer: Optional[asyncio.Task] = None
+
+  def create_task(self, coro: Coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    self.tasks.add(task)
+    task.add_done_callback(self.tasks.discard)
+    return task
+
+  def get_chunk_size(self, seconds_per_chunk: int) -> int:
+    return seconds_per_chunk * get_chunk_size_per_second(
+      self.synthesizer.get_synthesizer_config().audio_encoding,
+      self.synthesizer.get_synthesizer_config().sampling_rate,
+    )
+
+  async def synthesize(
+      self,
+      message: BaseMessage,
+      chunk_size: int,
+      presynthesis: Optional[asyncio.Task] = None) -> SynthesisResult:
+    """presynthesis, if given, resolves to message's speech or None."""
+    if presynthesis:
+      try:
+        synthesis_result = await presynthesis
+        if synthesis_result:
+          return synthesis_result
+      except asyncio.CancelledError:
+        self.drop_synthesis(presynthesis)
+        raise
+      except Exception as e:
+        self.logger.debug(f"Speculative synthesis failed: {e}")
+    # synthesizers that stream natively stay on the event loop
+    create_speech_async = getattr(self.synthesizer, "create_speech_async",
+                                  None)
+    if create_speech_async:
+      return await create_speech_async(message, chunk_size, self.bot_sentiment)
+    return await self.scheduler.run_blocking(
+      self.synthesizer.create_speech,
+      message,
+      chunk_size,
+      self.bot_sentiment,
+    )
+
+  def drop_synthesis(self, synthesis: asyncio.Task):
+    """Cancels speech that was synthesized ahead but won't be played."""
+
+    def cancel_result(task: asyncio.Task):
+      if not task.cancelled() and task.exception() is None:
+        cancel = getattr(task.result(), "cancel", None)
+        if cancel:
+          cancel()
+
+    synthesis.cancel()
+    synthesis.add_done_callback(cancel_result)
+
+  async def start(self):
+    self.trace.start()
+    self.trace.mark(CALL_ANSWERED)
+    self.transcriber_task = asyncio.create_task(self.transcriber.run())
+    is_ready = await self.transcriber.ready()
+    if not is_ready:
+      raise Exception("Transcriber startup failed")
+    if self.agent.get_agent_config().send_filler_audio:
+      filler_audio_config = (
+        self.agent.get_agent_config().send_filler_audio if isinstance(
+          self.agent.get_agent_config().send_filler_audio, FillerAudioConfig)
+        else FillerAudioConfig())
+      await self.scheduler.run_blocking(
+        self.synthesizer.set_filler_audios, filler_audio_config)
+    self.agent.start()
+    if self.agent.get_agent_config().initial_message:
+      self.transcript.add_bot_message(
+        self.agent.get_agent_config().initial_message.text)
+    self.send_message_to_stream_nonblocking(
+      self.agent.get_agent_config().initial_message, False)
+    self.active = True
+    if self.synthesizer.get_synthesizer_config().track_bot_sentiment_in_voice:
+      self.track_bot_sentiment_task = asyncio.create_task(
+        self.track_bot_sentiment())
+    self.check_for_idle_task = asyncio.create_task(self.check_for_idle())
+
+  async def send_messages_to_stream_async(
+    self,
+    messages,
+    should_allow_human_to_cut_off_bot: bool,
+    wait_for_filler_audio: bool = False,
+    first_synthesis: Optional[asyncio.Task] = None,
+  ):
+    """first_synthesis, if given, resolves to the first message's speech."""
+    # None marks the end of the agent's response
+    messages_queue: asyncio.Queue[Optional[BaseMessage]] = asyncio.Queue()
+    speech_cut_off = asyncio.Event()
+    seconds_per_chunk = TEXT_TO_SPEECH_CHUNK_SIZE_SECONDS
+    chunk_size = self.get_chunk_size(seconds_per_chunk)
+    turn_index = self.trace.current_turn
+
+    # the message playing plus the ones synthesized ahead of it
+    synthesis_slots = asyncio.Semaphore(self.synthesis_lookahead + 1)
+    # None marks the end of the response
+    synthesis_queue: asyncio.Queue[Optional[tuple[
+      BaseMessage, asyncio.Event, asyncio.Task]]] = asyncio.Queue()
+
+    async def synthesize_ahead():
+      presynthesis = first_synthesis
+      try:
+        while True:
+          message = await messages_queue.get()
+          if message is None:
+            break
+          await synthesis_slots.acquire()
+          stop_event = self.enqueue_stop_event()
+          synthesis = asyncio.create_task(
+            self.synthesize(message, chunk_size, presynthesis))
+          presynthesis = None
+          synthesis_queue.put_nowait((message, stop_event, synthesis))
+        synthesis_queue.put_nowait(None)
+      finally:
+        if presynthesis:
+          self.drop_synthesis(presynthesis)
+
+    async def send_to_call():
+      response_buffer = ""
+      cut_off = False
+      self.is_current_synthesis_interruptable = should_allow_human_to_cut_off_bot
+      synthesize_ahead_task = asyncio.create_task(synthesize_ahead())
+      try:
+        while True:
+          queued = await synthesis_queue.get()
+          if queued is None:
+            break
+          message, stop_event, synthesis = queued
+          try:
+            synthesis_result = await synthesis
+          except Exception as e:
+            # skip the sentence and go on with the rest of the response
+            self.logger.error(f"Synthesis failed for {message.text!r}: {e!r}")
+            stop_event.set()
+            synthesis_slots.release()
+            continue
+          message_sent, cut_off = await self.send_speech_to_output(
+            message.text,
+            synthesis_result,
+            stop_event,
+            seconds_per_chunk,
+            turn_index=turn_index,
+          )
+          synthesis_slots.release()
+          self.logger.debug("Message sent: {}".format(message_sent))
+          response_buffer = f"{response_buffer} {message_sent}"
+          if cut_off:
+            speech_cut_off.set()
+            break
+      except Exception:
+        # nothing awaits this task, so its errors would go unseen
+        self.logger.exception("Failed to send the agent's response")
+      finally:
+        synthesize_ahead_task.cancel()
+        while not synthesis_queue.empty():
+          queued = synthesis_queue.get_nowait()
+          if queued:
+            _, stop_event, synthesis = queued
+            stop_event.set()
+            self.drop_synthesis(synthesis)
+      if cut_off:
+        self.agent.update_last_bot_message_on_cut_off(response_buffer)
+      self.transcript.add_bot_message(response_buffer)
+      return response_buffer, cut_off
+
+    self.create_task(send_to_call())
+
+    messages_generated = 0
+    # async agents stream straight into the queue; sync generators are
+    # drained on the scheduler
+    if not isinstance(messages, AsyncIterable):
+      messages = self.scheduler.iterate_blocking(messages)
+    try:
+      async with aclosing(messages):
+        async for message in messages:
+          messages_generated += 1
+          if messages_generated == 1:
+            self.trace.mark(FIRST_LLM_TOKEN,
+                            getattr(self.agent, "first_token_time", None),
+                            turn_index=turn_index)
+          if messages_generated == 1 and wait_for_filler_audio:
+            self.interrupt_all_synthesis()
+            await self.wait_for_filler_audio_to_finish()
+          if speech_cut_off.is_set():
+            break
+          messages_queue.put_nowait(BaseMessage(text=message))
+      if messages_generated == 0:
+        self.logger.debug("Agent generated no messages")
+        if wait_for_filler_audio:
+          self.interrupt_all_synthesis()
+    finally:
+      # even if the agent fails, what it did generate is still played
+      messages_queue.put_nowait(None)
+
+  def send_message_to_stream_nonblocking(
+    self,
+    message: BaseMessage,
+    should_allow_human_to_cut_off_bot: bool,
+  ):
+    self.create_task(
+      self.send_message_to_stream_async(
+        message,
+        self.agent.get_agent_config().allow_agent_to_be_cut_off,
+      ))
+
+  async def send_message_to_stream_async(
+    self,
+    message: BaseMessage,
+    should_allow_human_to_cut_off_bot: bool,
+  ) -> tuple[str, bool]:
+    self.is_current_synthesis_interruptable = should_allow_human_to_cut_off_bot
+    turn_index = self.trace.current_turn
+    stop_event = self.enqueue_stop_event()
+    self.logger.debug("Synthesizing speech for message")
+    seconds_per_chunk = TEXT_TO_SPEECH_CHUNK_SIZE_SECONDS
+    synthesis_result = await self.synthesize(
+      message, self.get_chunk_size(seconds_per_chunk))
+    message_sent, cut_off = await self.send_speech_to_output(
+      message.text,
+      synthesis_result,
+      stop_event,
+      seconds_per_chunk,
+      turn_index=turn_index,
+    )
+    self.logger.debug("Message sent: {}".format(message_sent))
+    if cut_off:
+      self.agent.update_last_bot_message_on_cut_off(message_sent)
+    self.transcript.add_bot_message(message_sent)
+    return message_sent, cut_off
+
+  # returns an estimate of what was sent up to, and a flag if the message was cut off
+  async def send_speech_to_output(
+    self,
+    message,
+    synthesis_result: SynthesisResult,
+    stop_event: asyncio.Event,
+    seconds_per_chunk: int,
+    is_filler_audio: bool = False,
+    turn_index: Optional[int] = None,
+  ):
+    message_sent = message
+    cut_off = False
+    chunk_size = self.get_chunk_size(seconds_per_chunk)
+    i = 0
+    chunk_results = synthesis_result.chunk_generator
+    if not isinstance(chunk_results, AsyncIterable):
+      chunk_results = self.scheduler.iterate_blocking(chunk_results)
+    # closing stops synthesis that is still streaming when the bot is cut off
+    async with aclosing(chunk_results):
+      async for chunk_result in chunk_results:
+        start_time = time.time()
+        speech_length_seconds = seconds_per_chunk * (
+          len(chunk_result.chunk) / chunk_size)
+        if stop_event.is_set():
+          seconds = i * seconds_per_chunk
+          self.logger.debug(
+            "Interrupted, stopping text to speech after {} chunks".format(i))
+          message_sent = f"{synthesis_result.get_message_up_to(seconds)}-"
+          cut_off = True
+          break
+        if i == 0:
+          if is_filler_audio:
+            self.should_wait_for_filler_audio_done_event = True
+          else:
+            self.trace.mark(FIRST_TTS_BYTE, start_time, turn_index=turn_index)
+        await self.output_device.send_async(chunk_result.chunk)
+        if i == 0 and not is_filler_audio:
+          self.trace.mark(FIRST_AUDIO_SENT, turn_index=turn_index)
+        end_time = time.time()
+        await asyncio.sleep(
+          max(
+            speech_length_seconds - (end_time - start_time) -
+            self.per_chunk_allowance_seconds,
+            0,
+          ))
+        self.logger.debug("Sent chunk {} with size {}".format(
+          i, len(chunk_result.chunk)))
+        self.last_action_timestamp = time.time()
+        i += 1
+    # clears it off the stop events queue
+    if not stop_event.is_set():
+      stop_event.set()
+    return message_sent, cut_off
+
+  def enqueue_stop_event(self) -> asyncio.Event:
+    stop_event = asyncio.Event()
+    self.stop_events.put_nowait(stop_event)
+    return stop_event
+
+  def interrupt_all_synthesis(self) -> bool:
+    """Returns true if any synthesis was interrupted"""
+    num_interrupts = 0
+    while True:
+      try:
+        stop_event = self.stop_events.get_nowait()
+      except asyncio.QueueEmpty:
+        break
+      if not stop_event.is_set():
+        self.logger.debug("Interrupting synthesis")
+        stop_event.set()
+        num_interrupts += 1
+    return num_interrupts > 0
+
+  async def send_filler_audio_to_output(
+    self,
+    filler_audio: FillerAudio,
+    stop_event: asyncio.Event,
+    done_event: asyncio.Event,
+  ):
+    filler_synthesis_result = filler_audio.create_synthesis_result()
+    self.is_current_synthesis_interruptable = filler_audio.is_interruptable
+    if isinstance(self.agent.get_agent_config().send_filler_audio,
+                  FillerAudioConfig):
+      silence_threshold = (self.agent.get_agent_config().send_filler_audio.
+                           silence_threshold_seconds)
+    else:
+      silence_threshold = FILLER_AUDIO_DEFAULT_SILENCE_THRESHOLD_SECONDS
+    await asyncio.sleep(silence_threshold)
+    self.logger.debug("Sending filler audio to output")
+    await self.send_speech_to_output(
+      filler_audio.message.text,
+      filler_synthesis_result,
+      stop_event,
+      filler_audio.seconds_per_chunk,
+      is_filler_audio=True,
+    )
+    done_event.set()
+
+  async def wait_for_filler_audio_to_finish(self):
+    if not self.should_wait_for_filler_audio_done_event:
+      self.logger.debug(
+        "Not waiting for filler audio to finish since we didn't send any chunks"
+      )
+      return
+    self.should_wait_for_filler_audio_done_event = False
+    if (self.current_filler_audio_done_event
+        and not self.current_filler_audio_done_event.is_set()):
+      self.logger.debug("Waiting for filler audio to finish")
+      # this should guarantee that filler audio finishes, since it has to be on its last chunk
+      try:
+        await asyncio.wait_for(
+          self.current_filler_audio_done_event.wait(),
+          self.current_filler_seconds_per_chunk,
+        )
+      except asyncio.TimeoutError:
+        self.logger.debug("Filler audio did not finish")
+
+  async def track_bot_sentiment(self):
+    """Re-analyses the bot's sentiment only after the transcript changes."""
+    while self.is_active():
+      await self.transcript_changed.wait()
+      # debounce: messages often land in bursts, e.g. at the end of a turn
+      while True:
+        self.transcript_changed.clear()
+        try:
+          await asyncio.wait_for(self.transcript_changed.wait(),
+                                 BOT_SENTIMENT_DEBOUNCE_SECONDS)
+        except asyncio.TimeoutError:
+          break
+      await self.update_bot_sentiment()
+
+  async def update_bot_sentiment(self):
+    async with get_bot_sentiment_semaphore():
+      # taken after waiting for a slot so the freshest messages are analysed
+      transcript = self.transcript.get_recent_string(
+        BOT_SENTIMENT_WINDOW_MESSAGES)
+      try:
+        new_bot_sentiment = await self.scheduler.run_blocking(
+          self.bot_sentiment_analyser.analyse, transcript)
+      except Exception as e:
+        self.logger.debug(f"Bot sentiment analysis failed: {e}")
+        return
+    if new_bot_sentiment.emotion:
+      self.logger.debug("Bot sentiment: %s", new_bot_sentiment)
+      self.bot_sentiment = new_bot_sentiment
+
+  async def check_for_idle(self):
+    while self.is_active():
+      if time.time() - self.last_action_timestamp > (
+          self.agent.get_agent_config().allowed_idle_time_seconds
+          or ALLOWED_IDLE_TIME):
+        self.logger.debug("Conversation idle for too long, terminating")
+        self.trace.count(IDLE_TIMEOUTS)
+        self.mark_terminated()
+        return
+      await asyncio.sleep(15)
+
+  async def on_transcription_response(self, transcription: Transcription):
+    self.last_action_timestamp = time.time()
+    if transcription.is_final:
+      self.logger.debug("Got transcription: {}, confidence: {}".format(
+        transcription.message, transcription.confidence))
+    if not self.is_human_speaking:
+      # send interrupt
+      self.current_transcription_is_interrupt = False
+      if self.is_current_synthesis_interruptable:
+        self.logger.debug("sending interrupt")
+        self.current_transcription_is_interrupt = self.interrupt_all_synthesis()
+        if self.current_transcription_is_interrupt:
+          self.trace.count(INTERRUPTIONS)
+      self.logger.debug("Human started speaking")
+
+    transcription.is_interrupt = self.current_transcription_is_interrupt
+    self.is_human_speaking = not transcription.is_final
+    if transcription.is_final:
+      # transcribers that can't estimate when speech ended count from the
+      # final transcript
+      self.trace.start_turn(
+        getattr(self.transcriber, "speech_end_time", None)
+        or self.last_action_timestamp)
+      self.trace.mark(FINAL_TRANSCRIPT, self.last_action_timestamp)
+    return await self.handle_transcription(transcription)
+
+  def can_speculate(self) -> bool:
+    return (self.speculation_stable_ms > 0 and self.active
+            and self.agent.get_agent_config().generate_responses
+            and hasattr(self.agent, "speculate"))
+
+  def schedule_speculation(self, transcription: Transcription):
+    """Restarts the stability timer on every interim transcript.
+
+    Interim results only arrive while the caller is talking, so the timer
+    firing means they have paused. A running speculation is kept as long as
+    the interim text still matches it.
+    """
+    if not self.can_speculate() or not transcription.message.strip():
+      return
+    if self.speculation and not self.speculation.matches(
+        transcription.message):
+      self.cancel_speculation()
+    if self.speculation_timer:
+      self.speculation_timer.cancel()
+    self.speculation_timer = self.create_task(
+      self.speculate_when_stable(transcription.message))
+
+  async def speculate_when_stable(self, message: str):
+    await asyncio.sleep(self.speculation_stable_ms / 1000)
+    self.speculation_timer = None
+    if self.speculation:
+      return
+    self.logger.debug(f"Speculating on interim transcript: {message}")
+    self.speculation = self.agent.speculate(message)
+    self.trace.count(SPECULATIONS)
+    if self.presynthesize_speculation:
+      self.speculation_synthesis = self.create_task(
+        self.synthesize_first_message(self.speculation))
+
+  async def synthesize_first_message(
+      self, speculation: SpeculativeResponse) -> Optional[SynthesisResult]:
+    message = await speculation.first_message
+    if message is None:
+      return None
+    return await self.synthesize(
+      BaseMessage(text=message),
+      self.get_chunk_size(TEXT_TO_SPEECH_CHUNK_SIZE_SECONDS))
+
+  def cancel_speculation(self):
+    if self.speculation_timer:
+      self.speculation_timer.cancel()
+      self.speculation_timer = None
+    if self.speculation:
+      self.speculation.cancel()
+      self.speculation = None
+    if self.speculation_synthesis:
+      self.drop_synthesis(self.speculation_synthesis)
+      self.speculation_synthesis = None
+
+  def commit_speculation(
+    self, transcription: Transcription
+  ) -> Optional[tuple[SpeculativeResponse, Optional[asyncio.Task]]]:
+    """The speculation and its first synthesis if the final transcript hit."""
+    speculation, synthesis = self.speculation, self.speculation_synthesis
+    self.speculation = self.speculation_synthesis = None
+    self.cancel_speculation()
+    if speculation is None:
+      return None
+    # a cut-off response replaces the reply, so the speculation can't be used
+    uses_cut_off_response = (transcription.is_interrupt and
+                             self.agent.get_agent_config().cut_off_response)
+    if (speculation.matches(transcription.message)
+        and not uses_cut_off_response and speculation.try_commit()):
+      self.trace.count(SPECULATION_HITS)
+      self.trace.count(SPECULATION_SAVED_SECONDS,
+                       speculation.get_time_saved(self.last_action_timestamp))
+      self.logger.debug("Committed speculative response")
+      return speculation, synthesis
+    self.logger.debug("Dropped speculative response")
+    speculation.cancel()
+    if synthesis:
+      self.drop_synthesis(synthesis)
+    return None
+
+  async def handle_transcription(self, transcription: Transcription):
+    if not transcription.is_final:
+      self.schedule_speculation(transcription)
+      return
+    self.transcript.add_human_message(transcription.message)
+    goodbye_detected_task = None
+    if self.agent.get_agent_config().end_conversation_on_goodbye:
+      goodbye_detected_task = asyncio.create_task(
+        self.goodbye_model.is_goodbye(transcription.message))
+    if self.agent.get_agent_config().send_filler_audio:
+      self.logger.debug("Sending filler audio")
+      if self.synthesizer.filler_audios:
+        filler_audio = random.choice(self.synthesizer.filler_audios)
+        self.logger.debug(f"Chose {filler_audio.message.text}")
+        self.trace.count(FILLER_AUDIO)
+        self.current_filler_audio_done_event = asyncio.Event()
+        self.current_filler_seconds_per_chunk = filler_audio.seconds_per_chunk
+        stop_event = self.enqueue_stop_event()
+        self.create_task(
+          self.send_filler_audio_to_output(
+            filler_audio,
+            stop_event,
+            done_event=self.current_filler_audio_done_event,
+          ))
+      else:
+        self.logger.debug("No filler audio available for synthesizer")
+    self.logger.debug("Generating response for transcription")
+    if self.agent.get_agent_config().generate_responses:
+      first_synthesis = None
+      committed = self.commit_speculation(transcription)
+      if committed:
+        speculation, first_synthesis = committed
+        responses = speculation.responses()
+      else:
+        generate_response = getattr(self.agent, "generate_response_async",
+                                    self.agent.generate_response)
+        responses = generate_response(transcription.message,
+                                      is_interrupt=transcription.is_interrupt)
+      await self.send_messages_to_stream_async(
+        responses,
+        self.agent.get_agent_config().allow_agent_to_be_cut_off,
+        wait_for_filler_audio=self.agent.get_agent_config().send_filler_audio,
+        first_synthesis=first_synthesis,
+      )
+    else:
+      response, should_stop = await self.scheduler.run_blocking(
+        lambda: self.agent.respond(transcription.message,
+                                   is_interrupt=transcription.is_interrupt))
+      self.trace.mark(FIRST_LLM_TOKEN)
+      if self.agent.get_agent_config().send_filler_audio:
+        self.interrupt_all_synthesis()
+        await self.wait_for_filler_audio_to_finish()
+      if should_stop:
+        self.logger.debug("Agent requested to stop")
+        self.mark_terminated()
+        return
+      if response:
+        self.send_message_to_stream_nonblocking(
+          BaseMessage(text=response),
+          self.agent.get_agent_config().allow_agent_to_be_cut_off,
+        )
+      else:
+        self.logger.debug("No response generated")
+    if goodbye_detected_task:
+      try:
+        goodbye_detected = await asyncio.wait_for(goodbye_detected_task, 0.1)
+        if goodbye_detected:
+          self.logger.debug("Goodbye detected, ending conversation")
+          self.mark_terminated()
+          return
+      except asyncio.TimeoutError:
+        self.logger.debug("Goodbye detection timed out")
+
+  def terminate(self):
+    self.mark_terminated()
+    self.trace.finish()
+    if self.trace.trace_dir:
+      self.scheduler.submit(self.trace.dump, self.trace.to_dict())
+    if self.check_for_idle_task:
+      self.logger.debug("Terminating check_for_idle Task")
+      self.check_for_idle_task.cancel()
+    if self.track_bot_sentiment_task:
+      self.logger.debug("Terminating track_bot_sentiment Task")
+      self.track_bot_sentiment_task.cancel()
+    self.cancel_speculation()
+    self.logger.debug("Terminating synthesis tasks")
+    for task in list(self.tasks):
+      task.cancel()
+    self.interrupt_all_synthesis()
+    self.logger.debug("Terminating agent")
+    self.agent.terminate()
+    self.logger.debug("Terminating speech transcriber")
+    self.transcriber.terminate()
+    if self.transcriber_task:
+      self.logger.debug("Terminating transcriber task")
+      self.transcriber_task.cancel()
+    self.logger.debug("Successfully terminated")
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Union
+
+from vocode import getenv
+
+DEFAULT_MAX_MEMORY_BYTES = 32 * 1024 * 1024
+DEFAULT_CACHE_PATH = getenv(
+  "SYNTHESIS_CACHE_PATH",
+  os.path.join(os.path.dirname(os.path.dirname(__file__)), ".synthesis_cache"),
+)
+
+
+def create_cache_key(**fields) -> str:
+  return hashlib.sha256(
+    json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CachedAudio:
+  """Synthesized audio plus what had been said by the end of each second."""
+
+  def __init__(self, audio: Union[bytes, mmap.mmap], cutoffs: list[str]):
+    self.audio = audio
+    self.cutoffs = cutoffs
+
+  def get_message_up_to(self, seconds: float) -> str:
+    return self.cutoffs[min(int(seconds), len(self.cutoffs) - 1)]
+
+
+class SynthesisCache:
+  """Two-tier cache of synthesized audio keyed by create_cache_key.
+
+  The memory tier is an LRU bounded by total audio bytes; the disk tier keeps
+  one raw audio file and one JSON sidecar per key and memory-maps the audio on
+  a hit, so repeated lines are shared with the page cache across calls.
+  """
+
+  def __init__(
+    self,
+    path: Optional[str] = DEFAULT_CACHE_PATH,
+    max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+    logger: Optional[logging.Logger] = None,
+  ):
+    self.path = path
+    self.max_memory_bytes = max_memory_bytes
+    self.logger = logger or logging.getLogger(__name__)
+    self.entries: OrderedDict[str, CachedAudio] = OrderedDict()
+    self.memory_bytes = 0
+    self.lock = threading.Lock()
+    self.memory_hits = 0
+    self.disk_hits = 0
+    self.misses = 0
+    if self.path:
+      os.makedirs(self.path, exist_ok=True)
+
+  def get(self, key: str) -> Optional[CachedAudio]:
+    with self.lock:
+      cached_audio = self.entries.get(key)
+      if cached_audio:
+        self.entries.move_to_end(key)
+        self.memory_hits += 1
+        return cached_audio
+    cached_audio = self.load(key)
+    with self.lock:
+      if cached_audio:
+        self.disk_hits += 1
+        self.remember(key, cached_audio)
+      else:
+        self.misses += 1
+    return cached_audio
+
+  def peek(self, key: str) -> Optional[CachedAudio]:
+    """Memory-tier lookup that doesn't touch the LRU order or counters."""
+    with self.lock:
+      return self.entries.get(key)
+
+  def put(self, key: str, audio: bytes,
+          cutoffs: list[str]) -> Optional[CachedAudio]:
+    # no audio means synthesis failed; serving it would make the line silent
+    if not audio:
+      return None
+    cached_audio = CachedAudio(audio, cutoffs)
+    with self.lock:
+      self.remember(key, cached_audio)
+    if self.path:
+      self.store(key, cached_audio)
+    return cached_audio
+
+  def remember(self, key: str, cached_audio: CachedAudio):
+    previous = self.entries.pop(key, None)
+    if previous:
+      self.memory_bytes -= len(previous.audio)
+    self.entries[key] = cached_audio
+    self.memory_bytes += len(cached_audio.audio)
+    while self.memory_bytes > self.max_memory_bytes and len(self.entries) > 1:
+      _, evicted = self.entries.popitem(last=False)
+      self.memory_bytes -= len(evicted.audio)
+
+  def get_audio_path(self, key: str) -> str:
+    return os.path.join(self.path, f"{key}.bytes")
+
+  def get_metadata_path(self, key: str) -> str:
+    return os.path.join(self.path, f"{key}.json")
+
+  def load(self, key: str) -> Optional[CachedAudio]:
+    if not self.path:
+      return None
+    try:
+      with open(self.get_metadata_path(key)) as f:
+        cutoffs = json.load(f)["cutoffs"]
+      with open(self.get_audio_path(key), "rb") as f:
+        audio = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, KeyError):
+      return None
+    return CachedAudio(audio, cutoffs)
+
+  def store(self, key: str, cached_audio: CachedAudio):
+    # the sidecar is written last, so a reader never sees audio without it
+    try:
+      for path, data, mode in (
+        (self.get_audio_path(key), cached_audio.audio, "wb"),
+        (self.get_metadata_path(key),
+         json.dumps({"cutoffs": cached_audio.cutoffs}), "w"),
+      ):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, mode) as f:
+          f.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+      self.logger.debug(f"Could not write synthesis cache entry {key}: {e}")
+
+  def stats(self) -> dict:
+    with self.lock:
+      return {
+        "memory_hits": self.memory_hits,
+        "disk_hits": self.disk_hits,
+        "misses": self.misses,
+        "memory_entries": len(self.entries),
+        "memory_bytes": self.memory_bytes,
+      }
+
+
+_synthesis_cache: Optional[SynthesisCache] = None
+
+
+def get_synthesis_cache() -> SynthesisCache:
+  global _synthesis_cache
+  if _synthesis_cache is None:
+    _synthesis_cache = SynthesisCache()
+  return _synthesis_cache
@@ -0,0 +1,507 @@
+import asyncio
+import math
+import queue
+import threading
+from collections import defaultdict
+from collections.abc import AsyncIterable
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Callable, Generator, Optional
+
+import azure.cognitiveservices.speech as speechsdk
+from vocode import getenv
+from vocode.streaming.agent.bot_sentiment_analyser import BotSentiment
+from vocode.streaming.models.message import BaseMessage, SSMLMessage
+from vocode.streaming.synthesizer import (
+  azure_synthesizer,
+  eleven_labs_synthesizer,
+  google_synthesizer,
+)
+from vocode.streaming.synthesizer.base_synthesizer import (
+  FILLER_PHRASES,
+  FillerAudio,
+  SynthesisResult,
+  encode_as_wav,
+)
+from vocode.streaming.utils import get_chunk_size_per_second
+
+from call_server.scheduler import get_scheduler
+from call_server.synthesis_cache import (
+  CachedAudio,
+  SynthesisCache,
+  create_cache_key,
+  get_synthesis_cache,
+)
+
+# how long a message's audio may stall before Azure synthesis is given up on
+AZURE_AUDIO_TIMEOUT_SECONDS = int(getenv("AZURE_AUDIO_TIMEOUT_SECONDS", 10))
+
+
+class CancellableSynthesisResult(SynthesisResult):
+  """A SynthesisResult whose synthesis can be stopped before it is played.
+
+  is_failed is true once the provider gave up on the message, in which case
+  the chunks that were produced are only part of it.
+  """
+
+  def __init__(self,
+               chunk_generator,
+               get_message_up_to,
+               cancel: Callable[[], None],
+               is_failed: Callable[[], bool] = lambda: False):
+    super().__init__(chunk_generator, get_message_up_to)
+    self.cancel = cancel
+    self.is_failed = is_failed
+
+
+class CachingSynthesizer:
+  """Mixin that puts a SynthesisCache in front of a vocode synthesizer.
+
+  create_speech serves hits straight from the cache; misses stream from the
+  provider as usual and are recorded once the whole message has been played,
+  so interrupted synthesis never lands in the cache. Neither does synthesis
+  that produced no audio or that the provider reports as failed.
+  """
+
+  synthesis_cache: Optional[SynthesisCache] = None
+  # leading silence trimmed off filler audio
+  filler_audio_offset_ms = 0
+
+  def get_synthesis_cache(self) -> SynthesisCache:
+    return self.synthesis_cache or get_synthesis_cache()
+
+  def get_voice_cache_fields(self) -> dict:
+    return self.synthesizer_config.dict(
+      exclude={"api_key", "track_bot_sentiment_in_voice"})
+
+  def get_cache_key(
+    self,
+    message: BaseMessage,
+    bot_sentiment: Optional[BotSentiment] = None,
+  ) -> str:
+    return create_cache_key(
+      text=message.ssml if isinstance(message, SSMLMessage) else message.text,
+      voice=self.get_voice_cache_fields(),
+      sentiment=bot_sentiment.dict()
+      if bot_sentiment and bot_sentiment.emotion else None,
+    )
+
+  def is_cacheable(self) -> bool:
+    # wav-encoded chunks carry their own headers and can't be re-chunked
+    return not self.synthesizer_config.should_encode_as_wav
+
+  def create_cached_synthesis_result(
+    self,
+    cached_audio: CachedAudio,
+    chunk_size: int,
+  ) -> SynthesisResult:
+    audio = cached_audio.audio
+
+    def chunk_generator():
+      for i in range(0, len(audio), chunk_size):
+        yield SynthesisResult.ChunkResult(audio[i:i + chunk_size],
+                                          i + chunk_size >= len(audio))
+
+    return SynthesisResult(chunk_generator(), cached_audio.get_message_up_to)
+
+  def get_maybe_cached_synthesis_result(
+    self,
+    message: BaseMessage,
+    chunk_size: int,
+    bot_sentiment: Optional[BotSentiment] = None,
+  ) -> Optional[SynthesisResult]:
+    if not self.is_cacheable():
+      return None
+    cached_audio = self.get_synthesis_cache().get(
+      self.get_cache_key(message, bot_sentiment))
+    if cached_audio:
+      return self.create_cached_synthesis_result(cached_audio, chunk_size)
+    return None
+
+  def record_synthesis_result(
+    self,
+    cache_key: str,
+    synthesis_result: SynthesisResult,
+  ) -> SynthesisResult:
+    audio = bytearray()
+    bytes_per_second = get_chunk_size_per_second(
+      self.synthesizer_config.audio_encoding,
+      self.synthesizer_config.sampling_rate,
+    )
+
+    def store():
+      if (isinstance(synthesis_result, CancellableSynthesisResult)
+          and synthesis_result.is_failed()) or not audio:
+        return
+      seconds = math.ceil(len(audio) / bytes_per_second)
+      cutoffs = []
+      for second in range(seconds + 1):
+        cutoff = synthesis_result.get_message_up_to(second)
+        # AzureSynthesizer hands back the message itself once it's all spoken
+        cutoffs.append(cutoff.text if isinstance(cutoff, BaseMessage) else cutoff)
+      self.get_synthesis_cache().put(cache_key, bytes(audio), cutoffs)
+
+    def chunk_generator() -> Generator[SynthesisResult.ChunkResult, None, None]:
+      for chunk_result in synthesis_result.chunk_generator:
+        # copy now: some providers refill the same buffer for every chunk
+        audio.extend(chunk_result.chunk)
+        yield chunk_result
+      store()
+
+    async def async_chunk_generator(
+    ) -> AsyncGenerator[SynthesisResult.ChunkResult, None]:
+      async with aclosing(synthesis_result.chunk_generator) as chunk_results:
+        async for chunk_result in chunk_results:
+          audio.extend(chunk_result.chunk)
+          yield chunk_result
+      # the disk write stays off the event loop
+      get_scheduler().submit(store)
+
+    if isinstance(synthesis_result.chunk_generator, AsyncIterable):
+      chunk_results = async_chunk_generator()
+    else:
+      chunk_results = chunk_generator()
+    if isinstance(synthesis_result, CancellableSynthesisResult):
+      return CancellableSynthesisResult(chunk_results,
+                                        synthesis_result.get_message_up_to,
+                                        synthesis_result.cancel,
+                                        synthesis_result.is_failed)
+    return SynthesisResult(chunk_results, synthesis_result.get_message_up_to)
+
+  def create_speech(
+    self,
+    message: BaseMessage,
+    chunk_size: int,
+    bot_sentiment: Optional[BotSentiment] = None,
+  ) -> SynthesisResult:
+    cached_synthesis_result = self.get_maybe_cached_synthesis_result(
+      message, chunk_size, bot_sentiment)
+    if cached_synthesis_result:
+      return cached_synthesis_result
+    synthesis_result = super().create_speech(message, chunk_size,
+                                             bot_sentiment=bot_sentiment)
+    if not self.is_cacheable():
+      return synthesis_result
+    return self.record_synthesis_result(
+      self.get_cache_key(message, bot_sentiment), synthesis_result)
+
+  def synthesize_to_cache(self, message: BaseMessage) -> Optional[CachedAudio]:
+    """Synthesizes message in full (or reuses the cache) and returns the audio.
+
+    None if synthesis failed, since failed synthesis isn't cached.
+    """
+    chunk_size = get_chunk_size_per_second(
+      self.synthesizer_config.audio_encoding,
+      self.synthesizer_config.sampling_rate,
+    )
+    for _ in self.create_speech(message, chunk_size).chunk_generator:
+      pass
+    return self.get_synthesis_cache().peek(self.get_cache_key(message))
+
+  def get_phrase_filler_audios(self) -> list[FillerAudio]:
+    if not self.is_cacheable():
+      return super().get_phrase_filler_audios()
+    offset = get_chunk_size_per_second(
+      self.synthesizer_config.audio_encoding,
+      self.synthesizer_config.sampling_rate,
+    ) * self.filler_audio_offset_ms // 1000
+    filler_audios = []
+    for filler_phrase in FILLER_PHRASES:
+      cached_audio = self.synthesize_to_cache(filler_phrase)
+      # a phrase that failed to synthesize is left out rather than silent
+      if cached_audio is None:
+        continue
+      filler_audios.append(
+        FillerAudio(filler_phrase, cached_audio.audio[offset:],
+                    self.synthesizer_config))
+    return filler_audios
+
+
+class AzureUtterance:
+  """One Azure synthesis request; audio and word boundaries land here."""
+
+  def __init__(self, put_audio: Callable[[Optional[bytes]], None]):
+    # called from Azure's threads; None marks the end of the audio
+    self.put_audio = put_audio
+    self.word_boundaries = azure_synthesizer.WordBoundaryEventPool()
+    self.future: Optional[speechsdk.ResultFuture] = None
+    self.is_done = False
+    self.is_cancelled = False
+    # Azure canceled the request, or its audio stopped arriving, so the
+    # audio stops short of the message
+    self.is_failed = False
+
+  def finish(self):
+    if not self.is_done:
+      self.is_done = True
+      self.put_audio(None)
+
+
+class AzureSynthesisEngine(azure_synthesizer.AzureSynthesizer):
+  """vocode's AzureSynthesizer with one event subscription per synthesizer.
+
+  vocode connects another word boundary callback for every message, so each
+  event is appended to every earlier message's pool for the rest of the
+  call, and audio is pulled with blocking AudioDataStream reads. Here the
+  handlers are connected once, and audio (from synthesizing events) and word
+  boundaries are routed to each request by the result id its ResultFuture
+  resolves to once Azure starts on it. Events that arrive before that are
+  held and replayed.
+
+  Requests queue up on Azure's side, so the next sentence can be started
+  while the current one plays. Azure can only stop the request it is working
+  on, so a cancelled utterance is stopped when it is, or as soon as it
+  starts. Anything else that speaks on self.synthesizer must not overlap
+  them; the conversation generates filler audio before it speaks.
+  """
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    # Azure's callbacks may run on its own threads, or on the one starting
+    # the request
+    self.lock = threading.RLock()
+    self.utterances: dict[str, AzureUtterance] = {}
+    # requests whose result id isn't known yet, and the events for ids that
+    # may turn out to be theirs
+    self.starting_utterances = 0
+    self.early_events: defaultdict[str, list[tuple[Callable, Any]]] = (
+      defaultdict(list))
+    self.synthesizer.synthesizing.connect(self.on_synthesizing)
+    self.synthesizer.synthesis_word_boundary.connect(self.on_word_boundary)
+    self.synthesizer.synthesis_completed.connect(self.on_synthesis_done)
+    self.synthesizer.synthesis_canceled.connect(self.on_synthesis_done)
+
+  def get_utterance(self, result_id: str, on_event: Callable,
+                    evt: Any) -> Optional[AzureUtterance]:
+    """The utterance evt belongs to; holds evt if that isn't known yet."""
+    with self.lock:
+      utterance = self.utterances.get(result_id)
+      if utterance is None and self.starting_utterances:
+        self.early_events[result_id].append((on_event, evt))
+      return utterance
+
+  def on_synthesizing(self, evt: speechsdk.SpeechSynthesisEventArgs):
+    with self.lock:
+      utterance = self.get_utterance(evt.result.result_id,
+                                     self.on_synthesizing, evt)
+      if utterance and evt.result.audio_data:
+        utterance.put_audio(evt.result.audio_data)
+
+  def on_word_boundary(self,
+                       evt: speechsdk.SpeechSynthesisWordBoundaryEventArgs):
+    with self.lock:
+      utterance = self.get_utterance(evt.result_id, self.on_word_boundary, evt)
+      if utterance:
+        utterance.word_boundaries.add(evt)
+
+  def on_synthesis_done(self, evt: speechsdk.SpeechSynthesisEventArgs):
+    with self.lock:
+      if self.get_utterance(evt.result.result_id, self.on_synthesis_done,
+                            evt):
+        self.finish_utterance(evt.result)
+
+  def finish_utterance(self, result: speechsdk.SpeechSynthesisResult):
+    with self.lock:
+      utterance = self.utterances.pop(result.result_id, None)
+      if utterance is None:
+        return
+      if result.reason == speechsdk.ResultReason.Canceled:
+        self.logger.debug(
+          f"Azure synthesis canceled: {result.cancellation_details.reason}")
+        utterance.is_failed = True
+      utterance.finish()
+
+  def wait_for_start(self, utterance: AzureUtterance):
+    """Blocks until Azure starts on utterance, then routes its events."""
+    try:
+      result = utterance.future.get()
+    except Exception as e:
+      self.logger.warning(f"Azure synthesis failed to start: {e!r}")
+      result = None
+    with self.lock:
+      self.starting_utterances -= 1
+      if result is None:
+        utterance.is_failed = True
+        utterance.finish()
+      else:
+        self.utterances[result.result_id] = utterance
+        for on_event, evt in self.early_events.pop(result.result_id, []):
+          on_event(evt)
+        if result.reason == speechsdk.ResultReason.Canceled:
+          # Azure gave up on the request before any audio
+          self.finish_utterance(result)
+        elif utterance.is_cancelled and not utterance.is_done:
+          self.synthesizer.stop_speaking_async()
+      if not self.starting_utterances:
+        # whatever is left belongs to no request of ours
+        self.early_events.clear()
+
+  def start_utterance(
+      self, ssml: str, put_audio: Callable[[Optional[bytes]],
+                                           None]) -> AzureUtterance:
+    utterance = AzureUtterance(put_audio)
+    with self.lock:
+      utterance.future = self.synthesizer.start_speaking_ssml_async(ssml)
+      self.starting_utterances += 1
+    # ResultFuture.get blocks until Azure starts on the request
+    get_scheduler().submit(self.wait_for_start, utterance)
+    return utterance
+
+  def cancel_utterance(self, utterance: AzureUtterance):
+    with self.lock:
+      if utterance.is_done or utterance.is_cancelled:
+        return
+      utterance.is_cancelled = True
+      # under the lock, so the utterance can't finish and let the next
+      # request start before it is stopped
+      if utterance in self.utterances.values():
+        self.synthesizer.stop_speaking_async()
+
+  def give_up_on_utterance(self, utterance: AzureUtterance):
+    """Called when utterance's audio stalls for AZURE_AUDIO_TIMEOUT_SECONDS."""
+    self.logger.warning(
+      f"No audio from Azure for {AZURE_AUDIO_TIMEOUT_SECONDS}s, giving up")
+    with self.lock:
+      utterance.is_failed = True
+    self.cancel_utterance(utterance)
+
+  def get_ssml(self,
+               message: BaseMessage,
+               bot_sentiment: Optional[BotSentiment] = None) -> str:
+    if isinstance(message, SSMLMessage):
+      return message.ssml
+    return self.create_ssml(message.text, bot_sentiment=bot_sentiment)
+
+  def split_chunks(self, buffer: bytearray, chunk_size: int,
+                   is_last: bool) -> list[SynthesisResult.ChunkResult]:
+    """Takes whole chunks off buffer, and the remainder too once is_last."""
+    chunk_results = []
+    while len(buffer) >= chunk_size or (is_last and buffer):
+      chunk = bytes(buffer[:chunk_size])
+      del buffer[:chunk_size]
+      if self.synthesizer_config.should_encode_as_wav:
+        chunk = encode_as_wav(chunk, self.synthesizer_config)
+      chunk_results.append(
+        SynthesisResult.ChunkResult(chunk, is_last and not buffer))
+    return chunk_results
+
+  def create_synthesis_result(self, message: BaseMessage, ssml: str,
+                              utterance: AzureUtterance,
+                              chunk_generator) -> CancellableSynthesisResult:
+    return CancellableSynthesisResult(
+      chunk_generator,
+      lambda seconds: self.get_message_up_to(message, ssml, seconds,
+                                             utterance.word_boundaries),
+      lambda: self.cancel_utterance(utterance),
+      lambda: utterance.is_failed,
+    )
+
+  def create_speech(
+    self,
+    message: BaseMessage,
+    chunk_size: int,
+    bot_sentiment: Optional[BotSentiment] = None,
+  ) -> CancellableSynthesisResult:
+    """Blocking variant, for callers off the event loop (e.g. filler audio)."""
+    audio_queue: queue.Queue[Optional[bytes]] = queue.Queue()
+    ssml = self.get_ssml(message, bot_sentiment)
+    utterance = self.start_utterance(ssml, audio_queue.put)
+
+    def chunk_generator() -> Generator[SynthesisResult.ChunkResult, None, None]:
+      buffer = bytearray()
+      try:
+        while True:
+          try:
+            audio = audio_queue.get(timeout=AZURE_AUDIO_TIMEOUT_SECONDS)
+          except queue.Empty:
+            self.give_up_on_utterance(utterance)
+            break
+          if audio is None:
+            break
+          buffer.extend(audio)
+          yield from self.split_chunks(buffer, chunk_size, False)
+        yield from self.split_chunks(buffer, chunk_size, True)
+      finally:
+        self.cancel_utterance(utterance)
+
+    return self.create_synthesis_result(message, ssml, utterance,
+                                        chunk_generator())
+
+  async def create_speech_async(
+    self,
+    message: BaseMessage,
+    chunk_size: int,
+    bot_sentiment: Optional[BotSentiment] = None,
+  ) -> CancellableSynthesisResult:
+    """Starts synthesis and streams its audio on the running event loop."""
+    loop = asyncio.get_running_loop()
+    audio_queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue()
+    ssml = self.get_ssml(message, bot_sentiment)
+    utterance = self.start_utterance(
+      ssml,
+      lambda audio: loop.call_soon_threadsafe(audio_queue.put_nowait, audio))
+
+    async def chunk_generator(
+    ) -> AsyncGenerator[SynthesisResult.ChunkResult, None]:
+      buffer = bytearray()
+      try:
+        while True:
+          try:
+            audio = await asyncio.wait_for(audio_queue.get(),
+                                           AZURE_AUDIO_TIMEOUT_SECONDS)
+          except asyncio.TimeoutError:
+            self.give_up_on_utterance(utterance)
+            break
+          if audio is None:
+            break
+          buffer.extend(audio)
+          for chunk_result in self.split_chunks(buffer, chunk_size, False):
+            yield chunk_result
+        for chunk_result in self.split_chunks(buffer, chunk_size, True):
+          yield chunk_result
+      finally:
+        self.cancel_utterance(utterance)
+
+    return self.create_synthesis_result(message, ssml, utterance,
+                                        chunk_generator())
+
+
+class AzureSynthesizer(CachingSynthesizer, AzureSynthesisEngine):
+
+  # vocode trims Azure's lead-in off its filler audio
+  filler_audio_offset_ms = azure_synthesizer.AzureSynthesizer.OFFSET_MS
+
+  async def create_speech_async(
+    self,
+    message: BaseMessage,
+    chunk_size: int,
+    bot_sentiment: Optional[BotSentiment] = None,
+  ) -> SynthesisResult:
+    # a cache hit may read from disk
+    cached_synthesis_result = await get_scheduler().run_blocking(
+      self.get_maybe_cached_synthesis_result, message, chunk_size,
+      bot_sentiment)
+    if cached_synthesis_result:
+      return cached_synthesis_result
+    synthesis_result = await super().create_speech_async(
+      message, chunk_size, bot_sentiment)
+    if not self.is_cacheable():
+      return synthesis_result
+    return self.record_synthesis_result(
+      self.get_cache_key(message, bot_sentiment), synthesis_result)
+
+
+class GoogleSynthesizer(CachingSynthesizer,
+                        google_synthesizer.GoogleSynthesizer):
+
+  def get_voice_cache_fields(self) -> dict:
+    return {
+      **super().get_voice_cache_fields(),
+      "voice_name": self.voice.name,
+      "rate": self.audio_config.speaking_rate,
+      "pitch": self.audio_config.pitch,
+    }
+
+
+class ElevenLabsSynthesizer(CachingSynthesizer,
+                            eleven_labs_synthesizer.ElevenLabsSynthesizer):
+  pass
@@ -0,0 +1,233 @@
+import asyncio
+import audioop
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Optional
+
+import websockets
+from vocode import getenv
+from vocode.streaming.models.audio_encoding import AudioEncoding
+from vocode.streaming.transcriber import deepgram_transcriber
+from vocode.streaming.transcriber.base_transcriber import Transcription
+from vocode.streaming.transcriber.deepgram_transcriber import NUM_RESTARTS
+from vocode.streaming.utils import convert_wav
+from websockets.client import WebSocketClientProtocol
+
+from call_server.media_codec import MULAW_SILENCE, Resampler
+
+if TYPE_CHECKING:
+  from call_server.transcriber_pool import TranscriberSession
+
+DEEPGRAM_LISTEN_URL = "wss://api.deepgram.com/v1/listen"
+DEEPGRAM_API_URL = getenv("DEEPGRAM_API_URL", DEEPGRAM_LISTEN_URL)
+# vocode reads convo/audio/ajay.wav relative to the working directory; we
+# warm up with this file when set, and with silence otherwise
+TRANSCRIBER_WARMUP_AUDIO_PATH = getenv("TRANSCRIBER_WARMUP_AUDIO_PATH")
+WARMUP_AUDIO_SECONDS = 1
+# how long vocode waits for warmup results before calling the model ready
+WARMUP_SECONDS = 5
+# below this, audioop.ratecv is faster than Resampler
+RESAMPLER_MIN_CHUNK_MS = 100
+
+
+class DeepgramTranscriber(deepgram_transcriber.DeepgramTranscriber):
+  """vocode's DeepgramTranscriber that can start on a pre-warmed connection.
+
+  When create_transcriber leases a TranscriberSession from the pool, the
+  first run skips the handshake and warmup entirely; reconnects after that
+  open fresh connections as before, up to NUM_RESTARTS.
+  """
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.should_downsample = bool(
+      self.transcriber_config.downsampling
+      and self.transcriber_config.audio_encoding == AudioEncoding.LINEAR16)
+    self.input_rate = (self.transcriber_config.sampling_rate *
+                       (self.transcriber_config.downsampling or 1))
+    self.resampler: Optional[Resampler] = None
+    # audioop.ratecv's filter state, carried from one chunk to the next
+    self.ratecv_state = None
+    # wall time the caller stopped talking, estimated at each endpoint
+    self.speech_end_time: Optional[float] = None
+    self.session: Optional["TranscriberSession"] = None
+    self.ready_event = asyncio.Event()
+    # created up front so audio sent before the connection is up is kept
+    self.audio_queue: asyncio.Queue = asyncio.Queue()
+
+  def get_deepgram_url(self):
+    return super().get_deepgram_url().replace(DEEPGRAM_LISTEN_URL,
+                                              DEEPGRAM_API_URL, 1)
+
+  def get_warmup_bytes(self):
+    if TRANSCRIBER_WARMUP_AUDIO_PATH and os.path.exists(
+        TRANSCRIBER_WARMUP_AUDIO_PATH):
+      return convert_wav(
+        TRANSCRIBER_WARMUP_AUDIO_PATH,
+        self.transcriber_config.sampling_rate,
+        self.transcriber_config.audio_encoding,
+      )
+    num_samples = WARMUP_AUDIO_SECONDS * self.transcriber_config.sampling_rate
+    if self.transcriber_config.audio_encoding == AudioEncoding.MULAW:
+      return MULAW_SILENCE * num_samples
+    return b"\x00\x00" * num_samples
+
+  async def connect(self) -> WebSocketClientProtocol:
+    return await websockets.connect(
+      self.get_deepgram_url(),
+      extra_headers={"Authorization": f"Token {self.api_key}"},
+    )
+
+  async def ready(self):
+    await self.ready_event.wait()
+    return self.is_ready
+
+  def mark_ready(self, is_ready: bool = True):
+    self.warmed_up = True
+    self.is_ready = is_ready
+    self.ready_event.set()
+
+  async def run(self):
+    restarts = 0
+    while not self._ended and restarts < NUM_RESTARTS:
+      session, self.session = self.session, None
+      try:
+        if session:
+          await self.process_connection(await session.detach(), warmup=False)
+        else:
+          await self.process(self.transcriber_config.should_warmup_model)
+      # websockets raises asyncio.TimeoutError when the handshake times out
+      except (OSError, asyncio.TimeoutError,
+              websockets.WebSocketException) as e:
+        self.logger.debug(f"Could not connect to Deepgram: {e!r}")
+      restarts += 1
+      self.logger.debug(
+        "Deepgram connection died, restarting, num_restarts: %s", restarts)
+    # unblock a conversation still waiting on ready()
+    if not self.ready_event.is_set():
+      self.mark_ready(False)
+
+  async def process(self, warmup=True):
+    await self.process_connection(await self.connect(), warmup)
+
+  async def process_connection(self, ws: WebSocketClientProtocol,
+                               warmup: bool):
+    try:
+      await self.process_ws(ws, warmup)
+    finally:
+      await ws.close()
+
+  async def process_ws(self, ws: WebSocketClientProtocol, warmup: bool):
+    """vocode's process, on a connection that is already open."""
+
+    async def warmup_sender(ws: WebSocketClientProtocol):
+      if warmup:
+        for chunk in self.create_warmup_chunks():
+          await ws.send(chunk)
+        await asyncio.sleep(WARMUP_SECONDS)
+      self.mark_ready()
+
+    async def sender(ws: WebSocketClientProtocol):  # sends audio to websocket
+      while not self._ended:
+        try:
+          data = await asyncio.wait_for(self.audio_queue.get(), 5)
+        except asyncio.exceptions.TimeoutError:
+          break
+        await ws.send(data)
+      self.logger.debug("Terminating Deepgram transcriber sender")
+
+    async def receiver(ws: WebSocketClientProtocol):
+      buffer = ""
+      time_silent = 0
+      while not self._ended:
+        try:
+          msg = await ws.recv()
+        except Exception as e:
+          self.logger.debug(f"Got error {e} in Deepgram receiver")
+          break
+        data = json.loads(msg)
+        if not "is_final" in data:  # means we've finished receiving transcriptions
+          break
+        is_final = data["is_final"]
+        speech_final = self.is_speech_final(buffer, data, time_silent)
+        top_choice = data["channel"]["alternatives"][0]
+        confidence = top_choice["confidence"]
+
+        if (top_choice["transcript"] and confidence > 0.0 and self.warmed_up
+            and is_final):
+          buffer = f"{buffer} {top_choice['transcript']}"
+
+        if speech_final:
+          await self.on_response(
+            Transcription(buffer.strip(), confidence, True))
+          buffer = ""
+          time_silent = 0
+        elif top_choice["transcript"] and confidence > 0.0 and self.warmed_up:
+          # buffer only holds finalized segments; interim results carry the
+          # one still being spoken
+          message = (buffer if is_final else
+                     f"{buffer} {top_choice['transcript']}")
+          await self.on_response(Transcription(
+            message.strip(),
+            confidence,
+            False,
+          ))
+          time_silent = self.calculate_time_silent(data)
+        else:
+          time_silent += data["duration"]
+
+      self.logger.debug("Terminating Deepgram transcriber receiver")
+
+    await asyncio.gather(warmup_sender(ws), sender(ws), receiver(ws))
+
+  def set_input_chunk_ms(self, chunk_ms: int):
+    """Picks the resampler for audio that arrives chunk_ms at a time.
+
+    Resampler's windowed-sinc low-pass only keeps up with audioop.ratecv on
+    chunks of about RESAMPLER_MIN_CHUNK_MS or more, e.g. coalesced caller
+    audio; single 20 ms frames stay on ratecv.
+    """
+    if self.should_downsample and chunk_ms >= RESAMPLER_MIN_CHUNK_MS:
+      self.resampler = Resampler(self.input_rate,
+                                 self.transcriber_config.sampling_rate)
+
+  def send_audio(self, chunk):
+    if self.resampler:
+      chunk = self.resampler.process(chunk)
+    elif self.should_downsample:
+      chunk, self.ratecv_state = audioop.ratecv(
+        chunk,
+        2,
+        1,
+        self.input_rate,
+        self.transcriber_config.sampling_rate,
+        self.ratecv_state,
+      )
+    self.audio_queue.put_nowait(chunk)
+
+  def terminate(self):
+    super().terminate()
+    # a call that never started still holds its leased connection
+    if self.session:
+      session, self.session = self.session, None
+      asyncio.create_task(session.close())
+
+  def get_trailing_silence(self, deepgram_response: dict,
+                           time_silent: float) -> float:
+    words = deepgram_response["channel"]["alternatives"][0]["words"]
+    if words:
+      return (deepgram_response["start"] + deepgram_response["duration"] -
+              words[-1]["end"])
+    return time_silent + deepgram_response["duration"]
+
+  def is_speech_final(self, current_buffer: str, deepgram_response: dict,
+                      time_silent: float):
+    speech_final = super().is_speech_final(current_buffer, deepgram_response,
+                                           time_silent)
+    if speech_final:
+      # results arrive right behind the audio, so the silence Deepgram waited
+      # out before endpointing ended that long ago
+      self.speech_end_time = time.time() - self.get_trailing_silence(
+        deepgram_response, time_silent)
+    return speech_final
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+import websockets
+from vocode import getenv
+from vocode.streaming.models.transcriber import DeepgramTranscriberConfig
+from websockets.client import WebSocketClientProtocol
+
+from call_server.transcriber import WARMUP_SECONDS, DeepgramTranscriber
+
+# idle, warmed-up connections kept per transcriber config; 0 disables pooling
+TRANSCRIBER_POOL_SIZE = int(getenv("TRANSCRIBER_POOL_SIZE", 2))
+# idle connections older than this are replaced with fresh ones
+TRANSCRIBER_POOL_MAX_IDLE_SECONDS = 300
+# Deepgram closes a stream that gets no audio or KeepAlive for ~10 s
+HEALTH_CHECK_INTERVAL_SECONDS = 4
+HEALTH_CHECK_TIMEOUT_SECONDS = 2
+
+
+class TranscriberSession:
+  """An open Deepgram stream waiting in the pool for a call.
+
+  Until it is leased, a reader task discards whatever the server sends, so
+  warmup transcripts never reach the call that ends up using it.
+  """
+
+  def __init__(self, ws: WebSocketClientProtocol):
+    self.ws = ws
+    self.created_at = time.monotonic()
+    self.drain_task = asyncio.create_task(self.drain())
+
+  async def drain(self):
+    try:
+      async for _ in self.ws:
+        pass
+    except websockets.WebSocketException:
+      pass
+
+  def is_open(self) -> bool:
+    return self.ws.open and not self.drain_task.done()
+
+  def get_idle_seconds(self) -> float:
+    return time.monotonic() - self.created_at
+
+  async def check_health(self) -> bool:
+    try:
+      await self.ws.send(json.dumps({"type": "KeepAlive"}))
+      pong = await self.ws.ping()
+      await asyncio.wait_for(pong, HEALTH_CHECK_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, websockets.WebSocketException):
+      return False
+    return self.is_open()
+
+  async def detach(self) -> WebSocketClientProtocol:
+    """Stops draining and hands the connection to its transcriber."""
+    # cancelling recv() is safe in websockets; no message is lost
+    self.drain_task.cancel()
+    try:
+      await self.drain_task
+    except asyncio.CancelledError:
+      pass
+    return self.ws
+
+  async def close(self):
+    self.drain_task.cancel()
+    await self.ws.close()
+
+
+class TranscriberPool:
+  """Keeps pre-connected, pre-warmed Deepgram streams ready for new calls.
+
+  prewarm registers a transcriber config; a background task then keeps
+  `size` healthy idle sessions for it, sending KeepAlives, evicting dead or
+  stale ones and topping up right after every lease. lease never waits: an
+  empty pool just means the call connects on its own, as vocode does.
+  """
+
+  def __init__(
+    self,
+    size: int = TRANSCRIBER_POOL_SIZE,
+    max_idle_seconds: float = TRANSCRIBER_POOL_MAX_IDLE_SECONDS,
+    health_check_interval: float = HEALTH_CHECK_INTERVAL_SECONDS,
+    logger: Optional[logging.Logger] = None,
+  ):
+    self.size = size
+    self.max_idle_seconds = max_idle_seconds
+    self.health_check_interval = health_check_interval
+    self.logger = logger or logging.getLogger(__name__)
+    self.templates: dict[tuple[str, str], DeepgramTranscriber] = {}
+    self.idle: dict[tuple[str, str], deque[TranscriberSession]] = {}
+    self.opening: dict[tuple[str, str], int] = {}
+    self.replenish_event = asyncio.Event()
+    self.maintain_task: Optional[asyncio.Task] = None
+    self.tasks: set[asyncio.Task] = set()
+    self.leases = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def create_task(self, coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    self.tasks.add(task)
+    task.add_done_callback(self.tasks.discard)
+    return task
+
+  def get_key(self, transcriber: DeepgramTranscriber) -> tuple[str, str]:
+    return transcriber.get_deepgram_url(), transcriber.api_key
+
+  def prewarm(self, transcriber_config: DeepgramTranscriberConfig):
+    if self.size <= 0:
+      return
+    template = DeepgramTranscriber(transcriber_config, logger=self.logger)
+    key = self.get_key(template)
+    self.templates[key] = template
+    self.idle.setdefault(key, deque())
+    self.opening.setdefault(key, 0)
+    if self.maintain_task is None:
+      self.maintain_task = asyncio.create_task(self.maintain())
+    self.replenish_event.set()
+
+  def lease(self,
+            transcriber: DeepgramTranscriber) -> Optional[TranscriberSession]:
+    sessions = self.idle.get(self.get_key(transcriber))
+    if sessions is None:
+      return None
+    while sessions:
+      session = sessions.popleft()
+      if session.is_open():
+        self.leases += 1
+        self.replenish_event.set()
+        return session
+      self.create_task(session.close())
+    self.misses += 1
+    self.replenish_event.set()
+    return None
+
+  async def open_session(self, key: tuple[str, str]):
+    """Connects and warms up one session; counted in opening until done."""
+    template = self.templates[key]
+    session = None
+    try:
+      session = TranscriberSession(await template.connect())
+      if template.transcriber_config.should_warmup_model:
+        for chunk in template.create_warmup_chunks():
+          await session.ws.send(chunk)
+        await asyncio.sleep(WARMUP_SECONDS)
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+      self.logger.debug(f"Could not open pooled transcriber session: {e!r}")
+    finally:
+      self.opening[key] -= 1
+    if session and session.is_open():
+      self.idle[key].append(session)
+    elif session:
+      await session.close()
+
+  async def check_sessions(self, key: tuple[str, str]):
+    sessions = self.idle[key]
+    # leases pop sessions off the deque while the checks are awaited
+    snapshot = list(sessions)
+    healthy = await asyncio.gather(*(session.check_health()
+                                     for session in snapshot))
+    for session, is_healthy in zip(snapshot, healthy):
+      if is_healthy and session.get_idle_seconds() < self.max_idle_seconds:
+        continue
+      # the session may have been leased while we were checking
+      if session in sessions:
+        sessions.remove(session)
+        self.evictions += 1
+        await session.close()
+
+  async def maintain(self):
+    while True:
+      for key in self.templates:
+        await self.check_sessions(key)
+        missing = self.size - len(self.idle[key]) - self.opening[key]
+        for _ in range(missing):
+          self.opening[key] += 1
+          self.create_task(self.open_session(key))
+      self.replenish_event.clear()
+      try:
+        await asyncio.wait_for(self.replenish_event.wait(),
+                               self.health_check_interval)
+      except asyncio.TimeoutError:
+        pass
+
+  def stats(self) -> dict:
+    return {
+      "idle": sum(len(sessions) for sessions in self.idle.values()),
+      "opening": sum(self.opening.values()),
+      "leases": self.leases,
+      "misses": self.misses,
+      "evictions": self.evictions,
+    }
+
+  async def close(self):
+    if self.maintain_task:
+      self.maintain_task.cancel()
+      self.maintain_task = None
+    for task in list(self.tasks):
+      task.cancel()
+    for sessions in self.idle.values():
+      while sessions:
+        await sessions.popleft().close()
+
+
+_transcriber_pool: Optional[TranscriberPool] = None
+
+
+def get_transcriber_pool() -> TranscriberPool:
+  global _transcriber_pool
+  if _transcriber_pool is None:
+    _transcriber_pool = TranscriberPool()
+  return _transcriber_pool
@@ -0,0 +1,54 @@
+import time
+from typing import Callable
+
+from pydantic import PrivateAttr
+from vocode.streaming.utils import transcript
+from vocode.streaming.utils.transcript import Message, Sender
+
+
+class Transcript(transcript.Transcript):
+  """vocode's Transcript with a version counter and a cached rendering.
+
+  Messages must be added through add_human_message / add_bot_message; each
+  one bumps the version, extends the rendered string in place of rebuilding
+  it, and calls the registered listeners.
+  """
+
+  _version: int = PrivateAttr(default=0)
+  _rendered: str = PrivateAttr(default="")
+  _listeners: list[Callable[[], None]] = PrivateAttr(default_factory=list)
+
+  @property
+  def version(self) -> int:
+    return self._version
+
+  def add_listener(self, listener: Callable[[], None]):
+    self._listeners.append(listener)
+
+  def remove_listener(self, listener: Callable[[], None]):
+    self._listeners.remove(listener)
+
+  def add_message(self, text: str, sender: Sender):
+    message = Message(text=text, sender=sender, timestamp=time.time())
+    self.messages.append(message)
+    line = message.to_string()
+    self._rendered = f"{self._rendered}\n{line}" if self._rendered else line
+    self._version += 1
+    for listener in self._listeners:
+      listener()
+
+  def add_human_message(self, text: str):
+    self.add_message(text, Sender.HUMAN)
+
+  def add_bot_message(self, text: str):
+    self.add_message(text, Sender.BOT)
+
+  def to_string(self, include_timestamps: bool = False) -> str:
+    if include_timestamps:
+      return super().to_string(include_timestamps=True)
+    return self._rendered
+
+  def get_recent_string(self, max_messages: int) -> str:
+    """Renders only the last max_messages messages."""
+    return "\n".join(message.to_string()
+                     for message in self.messages[-max_messages:])
@@ -1,15 +1,13 @@
 # See README.md for instructions on how to get started
 from fastapi import Response
 import os
-import vocode
-from vocode.streaming.telephony.inbound_call_server import InboundCallServer
+from call_server.server import InboundCallServer
 from vocode.streaming.models.message import BaseMessage
 from vocode.streaming.models.telephony import TwilioConfig
 from vocode.streaming.models.agent import ChatGPTAgentConfig
 
-vocode.api_key = os.getenv("VOCODE_API_KEY")
-
-REPLIT_URL = f"https://{os.getenv('REPL_SLUG')}.{os.getenv('REPL_OWNER')}.repl.co"
+BASE_URL = f"{os.getenv('REPL_SLUG')}.{os.getenv('REPL_OWNER')}.repl.co"
+REPLIT_URL = f"https://{BASE_URL}"
 
 if __name__ == "__main__":
   server = InboundCallServer(
@@ -17,7 +15,9 @@ if __name__ == "__main__":
       initial_message=BaseMessage(text="Hey Zahid! What's up?"),
       prompt_preamble=
       "You are a helpful AI assistant. Answer questions in 50 words or less.",
+      generate_responses=True,
     ),
+    base_url=BASE_URL,
     twilio_config=TwilioConfig(
       account_sid=os.getenv("TWILIO_ACCOUNT_SID"),
       auth_token=os.getenv("TWILIO_AUTH_TOKEN"),